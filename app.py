@@ -1,4 +1,4 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Response
+from fastapi import FastAPI, UploadFile, File, HTTPException, Response, Request
 from fastapi.middleware.cors import CORSMiddleware
 from PIL import Image
 import io
@@ -9,8 +9,17 @@ import cv2
 from datetime import datetime, timedelta
 from typing import List, Dict
 import json
+import logging
+import time
 
-from inference import predict_image, visualize_image
+from inference import predict_image, predict_frames, visualize_image
+from metrics import (
+    stage, render_metrics, should_profile, profile_request,
+    REQUEST_SECONDS, REQUESTS_IN_FLIGHT, VIDEO_FPS, INFERENCE_ERRORS,
+)
+from config import VIDEO_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Shoplifting Detection API")
 
@@ -26,10 +35,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Queue depth, per-endpoint latency and the opt-in request profiler"""
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        if should_profile(request.headers):
+            with profile_request(request.url.path):
+                response = await call_next(request)
+        else:
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        # Label by route template, not raw path, to keep label cardinality bounded
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - start,
+            endpoint=route.path if route is not None else "other",
+            status=status,
+        )
+
 @app.get("/")
 async def root():
     return {"message": "Shoplifting Detection API", "status": "running"}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text-format metrics for this worker process"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/health")
 async def health():
     """Health check endpoint to verify models are available"""
@@ -51,7 +89,8 @@ async def predict(file: UploadFile = File(...)):
         
         # Read and process image
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        with stage("decode"):
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
         
         # Make prediction
         prob = predict_image(image)
@@ -95,14 +134,16 @@ async def visualize(file: UploadFile = File(...), threshold: float = 0.5):
         
         # Read and process image
         image_bytes = await file.read()
-        image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
+        with stage("decode"):
+            image = Image.open(io.BytesIO(image_bytes)).convert("RGB")
         
         # Generate visualization
         visualized_image = visualize_image(image, threshold=threshold)
         
         # Convert to bytes
         img_byte_arr = io.BytesIO()
-        visualized_image.save(img_byte_arr, format='JPEG')
+        with stage("encode_jpeg"):
+            visualized_image.save(img_byte_arr, format='JPEG')
         img_byte_arr.seek(0)
         
         return Response(content=img_byte_arr.read(), media_type="image/jpeg")
@@ -117,7 +158,8 @@ async def visualize(file: UploadFile = File(...), threshold: float = 0.5):
 async def analyze_video(
     file: UploadFile = File(...), 
     frame_skip: int = 5,
-    confidence_threshold: float = 0.7
+    confidence_threshold: float = 0.7,
+    cascade: bool = False
 ):
     """
     Analyzes a video file and returns timestamps of suspicious activity.
@@ -125,6 +167,8 @@ async def analyze_video(
     Parameters:
     - frame_skip: Process every Nth frame to speed up inference (default: 5)
     - confidence_threshold: Probability required to flag a frame (default: 0.7)
+    - cascade: Score pose first and only run the image stream on frames with a
+      person that pass the pose gate (default: False)
     """
     
     # 1. Validate File
@@ -147,47 +191,78 @@ async def analyze_video(
         detections = []
         is_shoplifting_detected = False
         max_prob = 0.0
+        failed_frames = 0
 
         current_frame = 0
-        
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Optimization: Skip frames to speed up processing
-            if current_frame % frame_skip != 0:
-                current_frame += 1
-                continue
-
-            # Convert BGR (OpenCV) to RGB (PIL)
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            pil_image = Image.fromarray(rgb_frame)
+        job_start = time.perf_counter()
+        batch_frames, batch_indices = [], []
 
+        def score_batch():
+            """Score the buffered frames in one batched forward pass"""
+            nonlocal max_prob, is_shoplifting_detected, failed_frames
+            if not batch_frames:
+                return
             # Run Inference
             try:
-                prob = predict_image(pil_image)
+                probs = predict_frames(batch_frames, cascade=cascade)
+            except FileNotFoundError:
+                raise  # Missing model: fail the request rather than report "Normal"
             except Exception:
-                prob = 0.0 # Handle inference errors gracefully
+                INFERENCE_ERRORS.inc(scope="batch")
+                logger.exception("Batch inference failed at frame %d; retrying per frame", batch_indices[0])
+                # One bad frame should not zero the whole batch
+                probs = []
+                for frame_index, frame in zip(batch_indices, batch_frames):
+                    try:
+                        probs.append(predict_frames([frame], cascade=cascade)[0])
+                    except Exception:
+                        INFERENCE_ERRORS.inc(scope="frame")
+                        logger.exception("Inference failed for frame %d", frame_index)
+                        failed_frames += 1
+                        probs.append(0.0)
 
-            # Update Max Probability found in video
-            if prob > max_prob:
-                max_prob = prob
+            for frame_index, prob in zip(batch_indices, probs):
+                # Update Max Probability found in video
+                if prob > max_prob:
+                    max_prob = prob
 
-            # Flag Detection
-            if prob > confidence_threshold:
-                is_shoplifting_detected = True
-                timestamp = round(current_frame / fps, 2)
-                
-                detections.append({
-                    "timestamp": timestamp,
-                    "frame_index": current_frame,
-                    "probability": round(prob, 4)
-                })
+                # Flag Detection
+                if prob > confidence_threshold:
+                    is_shoplifting_detected = True
+                    timestamp = round(frame_index / fps, 2)
+                    
+                    detections.append({
+                        "timestamp": timestamp,
+                        "frame_index": frame_index,
+                        "probability": round(prob, 4)
+                    })
+            batch_frames.clear()
+            batch_indices.clear()
+        
+        while True:
+            with stage("video_decode"):
+                # Optimization: Skip frames to speed up processing.
+                # grab() advances without the retrieve/BGR conversion of read()
+                if current_frame % frame_skip != 0:
+                    ret, frame = cap.grab(), None
+                else:
+                    ret, frame = cap.read()
+            if not ret:
+                break
+
+            if frame is not None:
+                batch_frames.append(frame)
+                batch_indices.append(current_frame)
+                if len(batch_frames) >= VIDEO_BATCH_SIZE:
+                    score_batch()
 
             current_frame += 1
 
+        score_batch()
         cap.release()
+        job_time = time.perf_counter() - job_start
+        if current_frame > 0 and job_time > 0:
+            VIDEO_FPS.observe(current_frame / job_time)
 
         # 3. Post-processing: Group timestamps into "events"
         # If we have timestamps [1.0, 1.2, 1.4, 5.0, 5.2], group them into events.
@@ -214,7 +289,8 @@ async def analyze_video(
             "overall_prediction": "Shoplifting Detected" if is_shoplifting_detected else "Normal",
             "max_confidence": round(max_prob, 4),
             "timeline_events": events,
-            "raw_detections_count": len(detections)
+            "raw_detections_count": len(detections),
+            "failed_frames": failed_frames
         }
         
         # Store in history
@@ -232,6 +308,8 @@ async def analyze_video(
         
         return result
 
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=503, detail=f"Model not available: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Video processing failed: {str(e)}")
     finally:
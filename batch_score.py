@@ -0,0 +1,334 @@
+"""
+Offline batch scoring of image folders and video archives.
+
+    python batch_score.py archive/ incidents/ --output scores.jsonl
+    python batch_score.py archive/ --output scores.csv --frame-skip 25 --cascade
+    python batch_score.py archive/ --output scores.jsonl --resume   # continue an interrupted run
+
+Decoding runs in a process pool, while the model scores frames in large batches in the
+main process. Workers downscale frames to BATCH_SCORE_MAX_SIDE before sending them back,
+and decoding runs at most BATCH_SCORE_MAX_INFLIGHT_FRAMES ahead of inference. Work is
+split into units: one per image, and one per segment of `segment` sampled frames of a
+video. Segments are planned from CAP_PROP_FRAME_COUNT, which is only an estimate for
+many containers (0 for some), so a segment that ends before EOF queues the next one
+until the worker reports EOF. A unit's id is appended to the checkpoint file
+(<output>.ckpt) only after its rows are flushed to the output, followed by a
+`path#eof` marker when a video's end was reached. --resume skips units already in the checkpoint. A crash between the two writes
+can leave duplicate rows for at most one batch. The checkpoint's first line records the
+run parameters that unit ids and rows depend on, and --resume refuses to continue
+with different ones.
+"""
+import argparse, csv, json, os, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+from tqdm import tqdm
+
+from dataset import list_images, list_videos, has_extension, IMAGE_EXTENSIONS, VIDEO_EXTENSIONS
+from inference import predict_frames
+from config import *
+
+FIELDS = ["path", "frame_index", "timestamp", "probability", "prediction", "error"]
+
+
+# =====================================================
+# WORK PLANNING
+# =====================================================
+def collect_inputs(inputs, recursive=True):
+    """Expand files and directories into sorted (images, videos) path lists"""
+    images, videos = [], []
+    for src in inputs:
+        if os.path.isdir(src):
+            images.extend(list_images(src, recursive=recursive))
+            videos.extend(list_videos(src, recursive=recursive))
+        elif has_extension(src, IMAGE_EXTENSIONS):
+            images.append(src)
+        elif has_extension(src, VIDEO_EXTENSIONS):
+            videos.append(src)
+    return sorted(set(images)), sorted(set(videos))
+
+
+def plan_units(images, videos, frame_skip, segment, done=frozenset()):
+    """
+    Yield decode tasks: ("image", path) or ("video", path, start, end, fps).
+    Every video segment covers at most `segment` sampled frames, up to the estimated
+    frame count. When resuming, a video without its `#eof` marker also continues
+    through the follow-on segments in `done`, up to the first unfinished one.
+    """
+    for path in images:
+        yield ("image", path)
+    span = frame_skip * segment
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+        finished = eof_id(path) in done
+        start = 0
+        while True:
+            task = ("video", path, start, start + span, fps)
+            yield task
+            start += span
+            if start >= total and (finished or unit_id(task) not in done):
+                break
+
+
+def unit_id(task):
+    return task[1] if task[0] == "image" else f"{task[1]}#{task[2]}"
+
+
+def eof_id(path):
+    """Checkpoint marker recording that a video was decoded to its end"""
+    return f"{path}#eof"
+
+
+def follow_on(task):
+    """The video segment after `task`, for when the frame count estimate was short"""
+    _, path, start, end, fps = task
+    return ("video", path, end, end + (end - start), fps)
+
+
+def unit_frames(task, segment):
+    """Upper bound on the frames a unit decodes"""
+    return 1 if task[0] == "image" else segment
+
+
+# =====================================================
+# DECODE (runs in worker processes)
+# =====================================================
+def _init_worker():
+    # One cv2 thread per process; the pool already provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def _downscale(frame, max_side):
+    """Shrink so the long side is at most max_side. Returns (frame, original/new ratio)."""
+    h, w = frame.shape[:2]
+    if not max_side or max(h, w) <= max_side:
+        return frame, 1.0
+    scale = max(h, w) / max_side
+    size = (max(1, round(w / scale)), max(1, round(h / scale)))
+    return cv2.resize(frame, size, interpolation=cv2.INTER_AREA), scale
+
+
+def decode_task(task, frame_skip, max_side=BATCH_SCORE_MAX_SIDE):
+    """
+    Returns (frames, scale, metas, error, eof). Frames are BGR uint8 as read by cv2,
+    downscaled in the worker so full-resolution frames never cross the process boundary.
+    scale maps pose keypoints back to the original resolution. eof is False only for a
+    video segment that ended at `end` without reaching the end of the file.
+    """
+    if task[0] == "image":
+        frame = cv2.imread(task[1], cv2.IMREAD_COLOR)
+        if frame is None:
+            return [], 1.0, [], "could not decode image", True
+        frame, scale = _downscale(frame, max_side)
+        return [frame], scale, [{"frame_index": None, "timestamp": None}], None, True
+
+    _, path, start, end, fps = task
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        return [], 1.0, [], "could not open video", True
+    scale = 1.0
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    frames, metas = [], []
+    index, eof = start, False
+    while index < end:
+        # grab() skips the retrieve/BGR conversion for frames we do not score
+        if index % frame_skip != 0:
+            if not cap.grab():
+                eof = True
+                break
+        else:
+            ret, frame = cap.read()
+            if not ret:
+                eof = True
+                break
+            frame, scale = _downscale(frame, max_side)
+            frames.append(frame)
+            metas.append({
+                "frame_index": index,
+                "timestamp": round(index / fps, 2) if fps else None,
+            })
+        index += 1
+    cap.release()
+    return frames, scale, metas, None, eof
+
+
+# =====================================================
+# OUTPUT
+# =====================================================
+class RowWriter:
+    """Streams rows to JSONL or CSV, appending when resuming"""
+    def __init__(self, path, fmt, append):
+        new_file = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self.f = open(path, "a" if append else "w", newline="")
+        self.fmt = fmt
+        if fmt == "csv":
+            self.csv = csv.DictWriter(self.f, fieldnames=FIELDS)
+            if new_file:
+                self.csv.writeheader()
+
+    def write(self, rows):
+        for row in rows:
+            if self.fmt == "csv":
+                self.csv.writerow(row)
+            else:
+                self.f.write(json.dumps(row) + "\n")
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+# =====================================================
+# CHECKPOINT
+# =====================================================
+def read_checkpoint(path, params):
+    """Unit ids finished by a previous run, after checking it used the same parameters"""
+    with open(path) as f:
+        header = f.readline()
+        try:
+            recorded = json.loads(header)["params"]
+        except (ValueError, KeyError, TypeError):
+            raise SystemExit(f"{path} has no run parameters header; cannot resume safely. "
+                             "Delete it (and the output) to start over.")
+        if recorded != params:
+            diff = {k: (recorded.get(k), v) for k, v in params.items() if recorded.get(k) != v}
+            raise SystemExit(f"Cannot resume: parameters differ from the checkpointed run "
+                             f"(checkpoint, now): {diff}")
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+# =====================================================
+# MAIN LOOP
+# =====================================================
+def score(inputs, output, fmt=None, batch_size=BATCH_SCORE_BATCH_SIZE, workers=None,
+          frame_skip=5, threshold=0.5, cascade=False, recursive=True, resume=False,
+          segment=BATCH_SCORE_SEGMENT, max_side=BATCH_SCORE_MAX_SIDE,
+          max_inflight_frames=BATCH_SCORE_MAX_INFLIGHT_FRAMES):
+    fmt = fmt or ("csv" if output.lower().endswith(".csv") else "jsonl")
+    workers = workers or os.cpu_count() or 1
+    ckpt_path = output + ".ckpt"
+    # Everything unit ids or row values depend on; a resumed run must match exactly
+    params = {"frame_skip": frame_skip, "segment": segment, "max_side": max_side,
+              "threshold": threshold, "cascade": cascade, "format": fmt}
+
+    done = set()
+    resume_ckpt = resume and os.path.exists(ckpt_path) and os.path.getsize(ckpt_path) > 0
+    if resume_ckpt:
+        done = read_checkpoint(ckpt_path, params)
+
+    images, videos = collect_inputs(inputs, recursive)
+    tasks = [t for t in plan_units(images, videos, frame_skip, segment, done) if unit_id(t) not in done]
+    print(f"{len(images)} images, {len(videos)} videos -> {len(tasks)} units to score"
+          + (f" ({len(done)} already done)" if done else ""))
+
+    writer = RowWriter(output, fmt, append=resume)
+    ckpt = open(ckpt_path, "a" if resume_ckpt else "w")
+    if not resume_ckpt:
+        ckpt.write(json.dumps({"params": params}) + "\n")
+        ckpt.flush()
+
+    # Buffered units waiting for the next forward pass: (checkpoint ids, path, metas, error)
+    buffered, frames, scales = [], [], []
+    n_items, start = 0, time.perf_counter()
+    progress = tqdm(total=len(tasks), unit="unit")
+
+    def flush():
+        nonlocal n_items
+        if not buffered:
+            return
+        probs = predict_frames(frames, cascade=cascade, pose_scale=scales) if frames else []
+        rows, i = [], 0
+        for ids, path, metas, error in buffered:
+            if error:
+                rows.append({"path": path, "frame_index": None, "timestamp": None,
+                             "probability": None, "prediction": None, "error": error})
+            for meta in metas:
+                p = probs[i]
+                i += 1
+                rows.append({"path": path, **meta, "probability": round(p, 4),
+                             "prediction": "Shoplifting" if p > threshold else "Normal",
+                             "error": None})
+        writer.write(rows)
+        # Checkpoint only after the rows are on disk
+        ckpt.write("".join(i + "\n" for ids, *_ in buffered for i in ids))
+        ckpt.flush()
+        n_items += len(frames)
+        progress.update(len(buffered))
+        progress.set_postfix(items_per_sec=f"{n_items / (time.perf_counter() - start):.1f}")
+        buffered.clear()
+        frames.clear()
+        scales.clear()
+
+    # Pool is created before the models are loaded, so forked workers stay light
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # Bounded in-order window: decoding runs ahead of inference by at most
+        # max_inflight_frames decoded frames (but always at least one unit)
+        window, inflight = deque(), 0
+        pending = deque(tasks)
+        queued = done | {unit_id(t) for t in tasks}
+        while window or pending:
+            while pending and (
+                    not window or inflight + unit_frames(pending[0], segment) <= max_inflight_frames):
+                task = pending.popleft()
+                window.append((task, pool.submit(decode_task, task, frame_skip, max_side)))
+                inflight += unit_frames(task, segment)
+            task, future = window.popleft()
+            inflight -= unit_frames(task, segment)
+            decoded, scale, metas, error, eof = future.result()
+            ids = [unit_id(task)]
+            if task[0] == "video":
+                if eof:
+                    ids.append(eof_id(task[1]))
+                elif unit_id(follow_on(task)) not in queued:
+                    # The frame count was an underestimate: keep going until EOF
+                    nxt = follow_on(task)
+                    queued.add(unit_id(nxt))
+                    pending.appendleft(nxt)
+                    progress.total += 1
+                    progress.refresh()
+            buffered.append((ids, task[1], metas, error))
+            frames.extend(decoded)
+            scales.extend([scale] * len(decoded))
+            if len(frames) >= batch_size:
+                flush()
+        flush()
+
+    progress.close()
+    writer.close()
+    ckpt.close()
+    elapsed = time.perf_counter() - start
+    print(f"✅ Scored {n_items} items in {elapsed:.1f}s "
+          f"({n_items / elapsed if elapsed else 0:.1f} items/s) -> {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-score image folders and video archives")
+    parser.add_argument("inputs", nargs="+", help="Image/video files or directories")
+    parser.add_argument("--output", required=True, help="Output .jsonl or .csv file")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None,
+                        help="Output format (default: from the output extension)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SCORE_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="Decode processes (default: CPU count)")
+    parser.add_argument("--frame-skip", type=int, default=5, help="Score every Nth video frame")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--cascade", action="store_true", help="Use pose-gated cascaded inference")
+    parser.add_argument("--no-recursive", action="store_true", help="Only scan the top level of directories")
+    parser.add_argument("--resume", action="store_true",
+                        help="Append to the output, skipping units recorded in <output>.ckpt "
+                             "(the run parameters must match the checkpointed run)")
+    args = parser.parse_args()
+
+    score(
+        args.inputs, args.output, fmt=args.format, batch_size=args.batch_size,
+        workers=args.workers, frame_skip=args.frame_skip, threshold=args.threshold,
+        cascade=args.cascade, recursive=not args.no_recursive, resume=args.resume,
+    )
+
+
+if __name__ == "__main__":
+    main()
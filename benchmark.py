@@ -0,0 +1,413 @@
+"""
+Reproducible inference benchmarks on synthetic images and videos.
+
+No dataset, trained weights or network access is needed: the fusion model is built
+with random weights, whose values do not affect its timings. YOLO falls back to its
+architecture yaml when POSE_MODEL_WEIGHTS is missing, but a random-weight pose model
+usually finds nobody, so the keypoint drawing and cascade paths are skipped and the
+end-to-end numbers are not production-like. The pose weights used are recorded in the
+results' meta, and --baseline refuses to compare runs whose meta differs.
+
+    python benchmark.py                               # write bench_results.json
+    python benchmark.py --baseline bench_baseline.json  # also exit 1 on regression
+    python benchmark.py --variants [--valid-dir DIR]    # teacher vs student size/latency/accuracy
+"""
+import argparse, io, json, os, platform, statistics, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import cv2
+import numpy as np
+import torch
+from PIL import Image
+from ultralytics import YOLO
+
+import inference
+from inference import draw_pose, draw_prediction, predict_image, visualize_image
+from model import DualStreamTransformerFusion, load_checkpoint
+from preprocess import frames_to_tensor
+from config import *
+
+
+# =====================================================
+# SYNTHETIC DATA
+# =====================================================
+def synthetic_frame(seed, width=BENCH_FRAME_SIZE[0], height=BENCH_FRAME_SIZE[1]):
+    """Deterministic RGB uint8 frame: smooth gradient plus noise, so JPEG sizes are realistic"""
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width]
+    base = np.stack([xx * 255 // width, yy * 255 // height, (xx + yy) * 255 // (width + height)], axis=-1)
+    noise = rng.integers(-20, 20, size=base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def synthetic_jpeg(seed):
+    buf = io.BytesIO()
+    Image.fromarray(synthetic_frame(seed)).save(buf, format="JPEG", quality=90)
+    return buf.getvalue()
+
+
+def synthetic_video(path, n_frames=BENCH_VIDEO_FRAMES, fps=25):
+    width, height = BENCH_FRAME_SIZE
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (width, height))
+    for i in range(n_frames):
+        writer.write(cv2.cvtColor(synthetic_frame(i), cv2.COLOR_RGB2BGR))
+    writer.release()
+
+
+def synthetic_keypoints(seed, width=BENCH_FRAME_SIZE[0], height=BENCH_FRAME_SIZE[1]):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(0, width, 17), rng.uniform(0, height, 17), rng.uniform(0.3, 1.0, 17)
+    ]).astype(np.float32)
+
+
+# =====================================================
+# TIMING
+# =====================================================
+def time_fn(fn, repeat=BENCH_REPEAT, warmup=BENCH_WARMUP):
+    """Call fn repeatedly and return latency stats in milliseconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        if DEVICE.type == "cuda":
+            torch.cuda.synchronize()
+        samples.append(1000 * (time.perf_counter() - start))
+    return _stats(samples)
+
+
+def _stats(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "n": len(samples),
+    }
+
+
+def bench_pose_weights():
+    """Pose weights the benchmark runs with: the real file, or the random-weight yaml"""
+    if os.path.exists(POSE_MODEL_WEIGHTS):
+        return POSE_MODEL_WEIGHTS
+    return POSE_MODEL_WEIGHTS.replace(".pt", ".yaml")
+
+
+def load_bench_models():
+    """Random-weight models, installed into inference so the real predict path uses them"""
+    pose_weights = bench_pose_weights()
+    if pose_weights != POSE_MODEL_WEIGHTS:
+        print(f"⚠️ {POSE_MODEL_WEIGHTS} not found; using random-weight {pose_weights}. "
+              "It rarely detects a person, so pose-dependent paths are not exercised.")
+    pose_model = YOLO(pose_weights)
+    torch.manual_seed(0)
+    model = DualStreamTransformerFusion(pretrained=False).to(DEVICE).eval()
+    inference._pose_model, inference._model = pose_model, model
+    return pose_model, model
+
+
+# =====================================================
+# BENCHMARKS
+# =====================================================
+def bench_stages(pose_model, model):
+    """Time each stage of the predict path in isolation, batch size 1"""
+    jpeg = synthetic_jpeg(0)
+    image = Image.open(io.BytesIO(jpeg)).convert("RGB")
+    frame = np.asarray(image)
+    img_tensor = frames_to_tensor([frame])
+    pose = torch.zeros(1, POSE_DIM, device=DEVICE)
+    kp = synthetic_keypoints(0)
+    bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+
+    with torch.no_grad():
+        feat = model.encode_image(img_tensor)
+
+        def overlay():
+            canvas = bgr.copy()
+            cv2.rectangle(canvas, (50, 50), (300, 400), (0, 255, 0), 2)
+            draw_pose(canvas, kp)
+            draw_prediction(canvas, 0.42, box_coords=(50, 50, 300, 400))
+            cv2.imencode(".jpg", canvas)
+
+        results = {
+            "stage.decode_jpeg": time_fn(lambda: Image.open(io.BytesIO(jpeg)).convert("RGB")),
+            "stage.yolo_pose": time_fn(lambda: pose_model(image, verbose=False, device="cpu")),
+            "stage.transform": time_fn(lambda: frames_to_tensor([frame])),
+            "stage.backbone": time_fn(lambda: model.encode_image(img_tensor)),
+            "stage.fusion_head": time_fn(lambda: model.fuse(feat, pose)),
+            "stage.overlay_render": time_fn(overlay),
+        }
+    results["e2e.predict_image"] = time_fn(lambda: predict_image(image))
+    results["e2e.visualize_image"] = time_fn(lambda: visualize_image(image))
+    return results
+
+
+def bench_video_decode():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.mp4")
+        synthetic_video(path)
+
+        def decode():
+            cap = cv2.VideoCapture(path)
+            while cap.read()[0]:
+                pass
+            cap.release()
+
+        stats = time_fn(decode, repeat=max(3, BENCH_REPEAT // 5))
+    stats["per_frame_ms"] = stats["p50_ms"] / BENCH_VIDEO_FRAMES
+    return {"stage.decode_video": stats}
+
+
+def bench_sweep(model, batch_sizes=BENCH_BATCH_SIZES, thread_counts=None):
+    """Preprocess, backbone and fusion-head latency over batch size x intra-op thread count"""
+    thread_counts = thread_counts or sorted({1, 2, 4, os.cpu_count() or 1})
+    prev_threads = torch.get_num_threads()
+    frames = [synthetic_frame(i) for i in range(max(batch_sizes))]
+    results = {}
+    with torch.no_grad():
+        for threads in thread_counts:
+            torch.set_num_threads(threads)
+            for bs in batch_sizes:
+                imgs = torch.randn(bs, 3, IMG_SIZE, IMG_SIZE, device=DEVICE)
+                poses = torch.randn(bs, POSE_DIM, device=DEVICE)
+                feat = model.encode_image(imgs)
+                for name, fn in (
+                    ("preprocess", lambda: frames_to_tensor(frames[:bs])),
+                    ("backbone", lambda: model.encode_image(imgs)),
+                    ("fusion_head", lambda: model.fuse(feat, poses)),
+                ):
+                    stats = time_fn(fn)
+                    stats["items_per_sec"] = 1000 * bs / stats["p50_ms"]
+                    results[f"sweep.{name}.bs{bs}.t{threads}"] = stats
+    torch.set_num_threads(prev_threads)
+    return results
+
+
+def bench_api(concurrency_levels=BENCH_API_CONCURRENCY, requests_per_level=BENCH_API_REQUESTS):
+    """In-process load test of the FastAPI endpoints via TestClient.
+
+    All requests share one event loop, like a single uvicorn worker.
+    """
+    from fastapi.testclient import TestClient
+    import app as app_module
+
+    jpeg = synthetic_jpeg(1)
+    results = {}
+    with TestClient(app_module.app) as client:
+        for endpoint in ("/predict", "/visualize"):
+            def call():
+                start = time.perf_counter()
+                r = client.post(endpoint, files={"file": ("bench.jpg", jpeg, "image/jpeg")})
+                r.raise_for_status()
+                return 1000 * (time.perf_counter() - start)
+
+            call()  # warm-up
+            for c in concurrency_levels:
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=c) as pool:
+                    latencies = list(pool.map(lambda _: call(), range(requests_per_level)))
+                elapsed = time.perf_counter() - start
+                stats = _stats(latencies)
+                stats["rps"] = requests_per_level / elapsed
+                results[f"api{endpoint.replace('/', '.')}.c{c}"] = stats
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.mp4")
+            synthetic_video(path)
+            with open(path, "rb") as f:
+                video = f.read()
+
+        def call_video():
+            r = client.post("/analyze_video", files={"file": ("bench.mp4", video, "video/mp4")})
+            r.raise_for_status()
+
+        results["api.analyze_video"] = time_fn(call_video, repeat=3, warmup=1)
+
+    app_module.detection_history.clear()
+    return results
+
+
+# =====================================================
+# MODEL VARIANTS
+# =====================================================
+def _student_arch(backbone):
+    return dict(
+        backbone=backbone,
+        d_model=STUDENT_D_MODEL,
+        layers=STUDENT_TRANSFORMER_LAYERS,
+        heads=STUDENT_TRANSFORMER_HEADS,
+        ff_dim=STUDENT_TRANSFORMER_FF_DIM,
+    )
+
+
+VARIANTS = {
+    "teacher": dict(
+        backbone=BACKBONE, d_model=D_MODEL, layers=TRANSFORMER_LAYERS,
+        heads=TRANSFORMER_HEADS, ff_dim=TRANSFORMER_FF_DIM,
+    ),
+    "student-resnet18": _student_arch("resnet18"),
+    "student-mobilenet_v3_large": _student_arch("mobilenet_v3_large"),
+    "student-mobilenet_v3_small": _student_arch("mobilenet_v3_small"),
+}
+
+
+def _accuracy(model, valid_dir):
+    from torch.utils.data import DataLoader
+    from dataset import ShopliftDataset
+
+    loader = DataLoader(ShopliftDataset(valid_dir), batch_size=BATCH_SIZE)
+    correct, total = 0, 0
+    with torch.no_grad():
+        for imgs, poses, labels in loader:
+            probs = torch.sigmoid(model(imgs.to(DEVICE), poses.to(DEVICE))).cpu()
+            correct += ((probs > 0.5).float() == labels).sum().item()
+            total += labels.size(0)
+    return 100.0 * correct / total
+
+
+def compare_variants(valid_dir=None, batch_sizes=(1, 8)):
+    """
+    Size / latency / accuracy table for the teacher and candidate students.
+    Latency uses random weights. Accuracy is only filled in for variants with
+    a trained checkpoint (MODEL_WEIGHTS_PATH / STUDENT_WEIGHTS_PATH) and a valid_dir.
+    """
+    trained = {}
+    for path in (MODEL_WEIGHTS_PATH, STUDENT_WEIGHTS_PATH):
+        if os.path.exists(path):
+            model = load_checkpoint(path, map_location=DEVICE)
+            trained[tuple(sorted(model.arch.items()))] = model
+
+    rows = []
+    for name, arch in VARIANTS.items():
+        model = trained.get(tuple(sorted(arch.items())))
+        if model is None:
+            model = DualStreamTransformerFusion(pretrained=False, **arch).to(DEVICE).eval()
+        row = {
+            "variant": name,
+            "backbone": arch["backbone"],
+            "params_m": sum(p.numel() for p in model.parameters()) / 1e6,
+            "size_mb": sum(t.numel() * t.element_size() for t in model.state_dict().values()) / 2**20,
+        }
+        with torch.no_grad():
+            for bs in batch_sizes:
+                imgs = torch.randn(bs, 3, IMG_SIZE, IMG_SIZE, device=DEVICE)
+                poses = torch.randn(bs, POSE_DIM, device=DEVICE)
+                row[f"bs{bs}_ms"] = time_fn(lambda: model(imgs, poses))["p50_ms"]
+        can_score = valid_dir and tuple(sorted(arch.items())) in trained
+        row["val_acc"] = _accuracy(model, valid_dir) if can_score else None
+        rows.append(row)
+
+    latency_cols = [f"bs{bs}_ms" for bs in batch_sizes]
+    print("| variant | backbone | params (M) | size (MB) | " + " | ".join(f"{c} p50" for c in latency_cols) + " | val acc |")
+    print("|---|---|---|---|" + "---|" * len(latency_cols) + "---|")
+    for r in rows:
+        acc = f"{r['val_acc']:.2f}%" if r["val_acc"] is not None else "-"
+        lat = " | ".join(f"{r[c]:.1f}" for c in latency_cols)
+        print(f"| {r['variant']} | {r['backbone']} | {r['params_m']:.1f} | {r['size_mb']:.1f} | {lat} | {acc} |")
+    return rows
+
+
+# =====================================================
+# RESULTS / REGRESSION CHECK
+# =====================================================
+def run_all():
+    torch.manual_seed(0)
+    pose_model, model = load_bench_models()
+    results = {}
+    results.update(bench_stages(pose_model, model))
+    results.update(bench_video_decode())
+    results.update(bench_sweep(model))
+    results.update(bench_api())
+    return {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "torch": torch.__version__,
+            "device": str(DEVICE),
+            "threads": torch.get_num_threads(),
+            "cpu_count": os.cpu_count(),
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "frame_size": list(BENCH_FRAME_SIZE),
+            "pose_weights": bench_pose_weights(),
+        },
+        "results": results,
+    }
+
+
+# Setup that changes the timings; runs that differ here are not comparable
+COMPARABLE_META = ("device", "threads", "cpu_count", "frame_size", "pose_weights", "torch")
+
+
+def meta_mismatches(current, baseline):
+    """(key, baseline value, current value) for each COMPARABLE_META entry that differs"""
+    base_meta, meta = baseline.get("meta", {}), current["meta"]
+    return [(k, base_meta.get(k), meta.get(k)) for k in COMPARABLE_META
+            if base_meta.get(k) != meta.get(k)]
+
+
+def find_regressions(current, baseline, tolerance=BENCH_TOLERANCE):
+    """Compare p50 latencies against a baseline run.
+
+    The baseline may carry a "thresholds" dict of per-key tolerances overriding `tolerance`.
+    Returns a list of (key, baseline_ms, current_ms, allowed_ratio).
+    """
+    thresholds = baseline.get("thresholds", {})
+    regressions = []
+    for key, base in baseline["results"].items():
+        if key not in current["results"]:
+            continue
+        allowed = 1 + thresholds.get(key, tolerance)
+        now = current["results"][key]["p50_ms"]
+        if now > base["p50_ms"] * allowed:
+            regressions.append((key, base["p50_ms"], now, allowed))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the shoplifting inference path")
+    parser.add_argument("--output", default=BENCH_RESULTS_PATH)
+    parser.add_argument("--baseline", default=None, help="Previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=BENCH_TOLERANCE,
+                        help="Allowed p50 slowdown as a fraction (0.15 = 15%%)")
+    parser.add_argument("--variants", action="store_true",
+                        help="Print the teacher/student size, latency and accuracy table instead")
+    parser.add_argument("--valid-dir", default=None,
+                        help="Validation images for the --variants accuracy column")
+    parser.add_argument("--allow-meta-mismatch", action="store_true",
+                        help="Compare against a baseline from a different setup (warn only)")
+    args = parser.parse_args()
+
+    if args.variants:
+        compare_variants(args.valid_dir)
+        return
+
+    report = run_all()
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {len(report['results'])} results to {args.output}")
+
+    for key, stats in report["results"].items():
+        print(f"{key:<40} p50 {stats['p50_ms']:>9.2f} ms   p95 {stats['p95_ms']:>9.2f} ms")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatches = meta_mismatches(report, baseline)
+        for key, base, now in mismatches:
+            print(f"⚠️ meta.{key} differs: baseline {base!r}, now {now!r}")
+        if mismatches and not args.allow_meta_mismatch:
+            raise SystemExit("Baseline was recorded on a different setup; not comparing "
+                             "(pass --allow-meta-mismatch to compare anyway)")
+        regressions = find_regressions(report, baseline, args.tolerance)
+        for key, base, now, allowed in regressions:
+            print(f"❌ {key}: {base:.2f} ms -> {now:.2f} ms (allowed x{allowed:.2f})")
+        if regressions:
+            raise SystemExit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
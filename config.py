@@ -18,3 +18,57 @@ NUM_WORKERS = 0
 
 POSE_MODEL_WEIGHTS = "yolov8n-pose.pt"
 MODEL_WEIGHTS_PATH = "weights/dual_stream_transformer_fusion.pth"
+
+# Distributed training (CPU nodes use the gloo backend)
+DIST_BACKEND = "gloo"
+DIST_MASTER_ADDR = "127.0.0.1"
+DIST_MASTER_PORT = 29500
+
+# Mixed precision / accumulation
+PRECISION = "auto"       # "auto" (fp16 on CUDA, bf16 on CPU) | "bf16" | "fp16" | "fp32"
+GRAD_ACCUM_STEPS = 1     # effective batch = BATCH_SIZE * GRAD_ACCUM_STEPS * world size
+COMPILE_MODEL = False    # torch.compile the fusion model before training
+
+# Benchmarks (benchmark.py)
+BENCH_RESULTS_PATH = "bench_results.json"
+BENCH_TOLERANCE = 0.15          # allowed p50 slowdown vs baseline before flagging a regression
+BENCH_FRAME_SIZE = (640, 480)   # (width, height) of synthetic images / video frames
+BENCH_VIDEO_FRAMES = 50
+BENCH_REPEAT = 20
+BENCH_WARMUP = 3
+BENCH_BATCH_SIZES = (1, 4, 8, 16)
+BENCH_API_CONCURRENCY = (1, 4)
+BENCH_API_REQUESTS = 20
+
+# Metrics / profiling (metrics.py)
+PROFILE_SAMPLE_RATE = 0.0       # fraction of HTTP requests to cProfile; 0 disables sampling
+PROFILE_ALLOW_HEADER = False    # also profile requests sent with "X-Profile: 1"
+PROFILE_DIR = "profiles"
+
+# Video analysis
+VIDEO_BATCH_SIZE = 8    # sampled frames scored per batched forward pass
+
+# Cascaded inference: pose-only gate in front of the image stream
+POSE_GATE_WEIGHTS_PATH = "weights/pose_gate.pth"
+CASCADE_THRESHOLD = 0.1   # frames whose gate score is below this skip the ResNet stream
+POSE_GATE_EPOCHS = 30
+
+# Backbone / distilled student (train.py --distill)
+BACKBONE = "resnet50"   # resnet50 | resnet18 | mobilenet_v3_large | mobilenet_v3_small
+STUDENT_BACKBONE = "mobilenet_v3_large"
+STUDENT_D_MODEL = 256
+STUDENT_TRANSFORMER_LAYERS = 1
+STUDENT_TRANSFORMER_HEADS = 4
+STUDENT_TRANSFORMER_FF_DIM = 512
+STUDENT_WEIGHTS_PATH = "weights/student_fusion.pth"
+DISTILL_ALPHA = 0.5         # weight of the ground-truth loss vs the teacher's soft targets
+DISTILL_TEMPERATURE = 2.0
+
+# Checkpoint served by inference.py (teacher or student, both formats load)
+INFERENCE_WEIGHTS_PATH = MODEL_WEIGHTS_PATH
+
+# Offline batch scoring (batch_score.py)
+BATCH_SCORE_BATCH_SIZE = 32     # frames per forward pass
+BATCH_SCORE_SEGMENT = 30        # sampled video frames decoded per worker task
+BATCH_SCORE_MAX_SIDE = 640      # workers downscale frames to this long side (YOLO input size)
+BATCH_SCORE_MAX_INFLIGHT_FRAMES = 512  # decoded frames held ahead of inference (~0.5 GB at 640px)
@@ -1,17 +1,41 @@
-import os, glob, torch
+import os, torch
+import cv2
 from torch.utils.data import Dataset
 from PIL import Image
 from ultralytics import YOLO
+from preprocess import frames_to_tensor, poses_from_results
 from config import *
 
-def list_images(folder):
+IMAGE_EXTENSIONS = (".jpg", ".png", ".jpeg", ".webp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+
+def has_extension(path, extensions):
+    """Case-insensitive suffix check, so IMG_0001.JPG and CLIP.MP4 are picked up"""
+    return path.lower().endswith(extensions)
+
+def _list_files(folder, extensions, recursive=False):
     paths = []
-    for ext in ("*.jpg", "*.png", "*.jpeg", "*.webp"):
-        paths.extend(glob.glob(os.path.join(folder, ext)))
+    for root, dirs, files in os.walk(folder):
+        # Skip hidden files and directories, as glob did
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        paths.extend(os.path.join(root, f) for f in files
+                     if not f.startswith(".") and has_extension(f, extensions))
+        if not recursive:
+            break
     return sorted(paths)
 
+def list_images(folder, recursive=False):
+    return _list_files(folder, IMAGE_EXTENSIONS, recursive)
+
+def list_videos(folder, recursive=False):
+    return _list_files(folder, VIDEO_EXTENSIONS, recursive)
+
 class ShopliftDataset(Dataset):
-    def __init__(self, img_dir, transform):
+    def __init__(self, img_dir, transform=None):
+        """
+        transform=None uses preprocess.frames_to_tensor, the same preprocessing as
+        inference. A custom transform (e.g. augmentation) gets an RGB PIL image instead.
+        """
         self.image_paths = list_images(img_dir)
         self.transform = transform
         # Force YOLO to use CPU to avoid torchvision NMS CUDA issues
@@ -21,25 +45,27 @@ class ShopliftDataset(Dataset):
     def __len__(self):
         return len(self.image_paths)
 
-    def extract_pose(self, img_path):
+    def extract_pose(self, source):
+        """source: image path or already-decoded BGR frame"""
         pose = torch.zeros(POSE_DIM, dtype=torch.float32)
         try:
             # Use CPU device for YOLO inference to avoid torchvision NMS CUDA issues
-            r = self.pose_model(img_path, verbose=False, device='cpu')[0]
-            if r.keypoints is not None and r.keypoints.data.shape[0] > 0:
-                pose_data = r.keypoints.data[0].cpu().numpy().flatten()
-                pose_len = min(len(pose_data), POSE_DIM)
-                pose[:pose_len] = torch.tensor(pose_data[:pose_len], dtype=torch.float32)
+            results = self.pose_model(source, verbose=False, device='cpu')
+            pose = poses_from_results(results)[0]
         except:
             pass
         return pose
 
     def __getitem__(self, idx):
         img_path = self.image_paths[idx]
-        image = Image.open(img_path).convert("RGB")
-        image = self.transform(image)
-
-        pose = self.extract_pose(img_path)
+        frame = cv2.imread(img_path, cv2.IMREAD_COLOR)
+        # Reuse the decoded frame for YOLO (BGR is its native NumPy layout)
+        pose = self.extract_pose(frame)
+        if self.transform is None:
+            # Same cv2 path as serving, so the model sees identical inputs
+            image = frames_to_tensor([frame], bgr=True, device="cpu")[0]
+        else:
+            image = self.transform(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
 
         label = 0.0
         # Cross-platform path handling: replace images with labels directory
@@ -1,62 +1,148 @@
 import torch
 import os
+import time
+import logging
 import cv2
 import numpy as np
 from PIL import Image
-from torchvision import transforms
 from ultralytics import YOLO
 
-from model import DualStreamTransformerFusion
+from model import PoseGate, load_checkpoint
+from metrics import stage, CASCADE_FRAMES, MODEL_LOAD_SECONDS
+from preprocess import frames_to_tensor, has_person, poses_from_results
 from config import *
 
+logger = logging.getLogger(__name__)
+
 # Lazy-loaded models
 _pose_model = None
 _model = None
-_transform = transforms.Compose([
-    transforms.Resize((IMG_SIZE, IMG_SIZE)),
-    transforms.ToTensor(),
-    transforms.Normalize([0.485,0.456,0.406],[0.229,0.224,0.225])
-])
+_pose_gate = None
+_pose_gate_checked = False
 
 def _load_models():
     """Lazy load models on first use"""
     global _pose_model, _model
     
+    if _pose_model is not None and _model is not None:
+        return _pose_model, _model
+    
     if _pose_model is None:
         if not os.path.exists(POSE_MODEL_WEIGHTS):
             raise FileNotFoundError(f"Pose model weights not found: {POSE_MODEL_WEIGHTS}")
+        start = time.perf_counter()
         # Force YOLO to use CPU to avoid torchvision NMS CUDA issues
         _pose_model = YOLO(POSE_MODEL_WEIGHTS)
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, model="pose")
     
     if _model is None:
-        if not os.path.exists(MODEL_WEIGHTS_PATH):
-            raise FileNotFoundError(f"Model weights not found: {MODEL_WEIGHTS_PATH}. Please train the model first.")
-        _model = DualStreamTransformerFusion().to(DEVICE)
-        _model.load_state_dict(torch.load(MODEL_WEIGHTS_PATH, map_location=DEVICE))
-        _model.eval()
+        if not os.path.exists(INFERENCE_WEIGHTS_PATH):
+            raise FileNotFoundError(f"Model weights not found: {INFERENCE_WEIGHTS_PATH}. Please train the model first.")
+        start = time.perf_counter()
+        # Teacher or distilled student; the checkpoint carries its own architecture
+        _model = load_checkpoint(INFERENCE_WEIGHTS_PATH, map_location=DEVICE)
+        MODEL_LOAD_SECONDS.set(time.perf_counter() - start, model="fusion")
     
     return _pose_model, _model
 
+def _load_pose_gate():
+    """Lazy load the optional pose gate; None if it has not been trained"""
+    global _pose_gate, _pose_gate_checked
+    
+    if not _pose_gate_checked:
+        if os.path.exists(POSE_GATE_WEIGHTS_PATH):
+            start = time.perf_counter()
+            try:
+                gate = PoseGate()
+                gate.load_state_dict(torch.load(POSE_GATE_WEIGHTS_PATH, map_location="cpu"))
+                gate.eval()
+            except Exception:
+                # Never serve a randomly initialised gate; fall back to person-only skipping
+                logger.exception("Could not load pose gate from %s; cascade runs without it",
+                                 POSE_GATE_WEIGHTS_PATH)
+            else:
+                _pose_gate = gate
+                MODEL_LOAD_SECONDS.set(time.perf_counter() - start, model="pose_gate")
+        _pose_gate_checked = True
+    
+    return _pose_gate
+
+def _score(model, img_tensor, poses):
+    """Run backbone + fusion head on a preprocessed batch, returning probabilities"""
+    with torch.no_grad():
+        with stage("backbone"):
+            img_feat = model.encode_image(img_tensor)
+        with stage("fusion"):
+            probs = torch.sigmoid(model.fuse(img_feat, poses.to(DEVICE))).view(-1)
+            # Copy to host inside the stage: this syncs, so queued GPU work is timed here
+            probs = probs.tolist()
+    return probs
+
 def predict_image(image: Image.Image) -> float:
     """Predict shoplifting probability for an image"""
     pose_model, model = _load_models()
     
-    img_tensor = _transform(image).unsqueeze(0).to(DEVICE)
+    with stage("transform"):
+        img_tensor = frames_to_tensor([np.asarray(image.convert('RGB'))])
 
-    pose = torch.zeros(POSE_DIM)
-    # Use CPU device for YOLO inference to avoid torchvision NMS CUDA issues
-    r = pose_model(image, verbose=False, device='cpu')[0]
-    if r.keypoints is not None and r.keypoints.data.shape[0] > 0:
-        pose_data = r.keypoints.data[0].cpu().numpy().flatten()
-        pose_len = min(len(pose_data), POSE_DIM)
-        pose[:pose_len] = torch.tensor(pose_data[:pose_len], dtype=torch.float32)
+    with stage("pose"):
+        # Use CPU device for YOLO inference to avoid torchvision NMS CUDA issues
+        results = pose_model(image, verbose=False, device='cpu')
+        poses = poses_from_results(results)
 
-    pose = pose.unsqueeze(0).to(DEVICE)
+    return _score(model, img_tensor, poses)[0]
 
-    with torch.no_grad():
-        prob = torch.sigmoid(model(img_tensor, pose)).item()
+def cascade_mask(results, poses, threshold=CASCADE_THRESHOLD):
+    """
+    Decide which frames need the full dual-stream model.
+    Returns (run_full bool tensor, cheap scores used for the frames that skip it).
+    Frames with nobody in them always skip it. If a pose gate is trained,
+    frames it scores below `threshold` skip too.
+    """
+    person = torch.tensor([has_person(r) for r in results], dtype=torch.bool)
+    run_full = person.clone()
+    cheap = torch.zeros(len(results))
+    gate = _load_pose_gate()
+    if gate is not None and person.any():
+        with torch.no_grad(), stage("pose_gate"):
+            scores = torch.sigmoid(gate(poses)).view(-1)
+        cheap = torch.where(person, scores, cheap)
+        run_full &= scores >= threshold
+    return run_full, cheap
 
-    return prob
+def predict_frames(frames, cascade=False, threshold=CASCADE_THRESHOLD, pose_scale=None) -> list:
+    """
+    Predict shoplifting probabilities for a batch of BGR uint8 frames (as read by cv2).
+    With cascade=True, pose is scored first and the image stream only runs on
+    frames that pass `cascade_mask`; the other frames get the cheap score.
+    pose_scale: per-frame original/current size ratio for downscaled frames, so
+    keypoints stay in the original pixel coordinates the model was trained on.
+    """
+    if len(frames) == 0:
+        return []
+    pose_model, model = _load_models()
+
+    with stage("pose"):
+        # YOLO treats NumPy inputs as BGR, so cv2 frames go in unconverted
+        results = pose_model(list(frames), verbose=False, device='cpu')
+        poses = poses_from_results(results, scale=pose_scale)
+
+    if not cascade:
+        with stage("transform"):
+            img_tensor = frames_to_tensor(frames, bgr=True)
+        return _score(model, img_tensor, poses)
+
+    run_full, probs = cascade_mask(results, poses, threshold)
+    probs = probs.tolist()
+    idx = run_full.nonzero().view(-1).tolist()
+    CASCADE_FRAMES.inc(len(idx), path="full")
+    CASCADE_FRAMES.inc(len(frames) - len(idx), path="skipped")
+    if idx:
+        with stage("transform"):
+            img_tensor = frames_to_tensor([frames[i] for i in idx], bgr=True)
+        for i, p in zip(idx, _score(model, img_tensor, poses[idx])):
+            probs[i] = p
+    return probs
 
 # Define skeleton connectivity for drawing
 SKELETON = [
@@ -82,46 +168,8 @@ def draw_pose(image, keypoints):
                 cv2.line(image, (int(x1),int(y1)), (int(x2),int(y2)), (0,255,255), 2)
     return image
 
-def visualize_image(image: Image.Image, threshold: float = 0.5) -> Image.Image:
-    """
-    Visualize image with pose keypoints, skeleton, bounding boxes, and prediction.
-    Returns a PIL Image with the visualization overlay.
-    """
-    pose_model, model = _load_models()
-    
-    # Convert PIL to OpenCV format
-    img_array = np.array(image.convert('RGB'))
-    img_rgb = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
-    img_rgb_copy = img_rgb.copy()
-    
-    # Run pose detection
-    r = pose_model(image, verbose=False, device='cpu')[0]
-    
-    # Draw bounding boxes and get box coordinates for text placement
-    box_coords = None
-    if r.boxes is not None and len(r.boxes) > 0:
-        box = r.boxes.xyxy[0].cpu().numpy()
-        x1, y1, x2, y2 = map(int, box)
-        cv2.rectangle(img_rgb_copy, (x1, y1), (x2, y2), (0, 255, 0), 2)
-        box_coords = (x1, y1, x2, y2)
-    
-    # Extract and draw keypoints
-    pose = torch.zeros(POSE_DIM)
-    if r.keypoints is not None and hasattr(r.keypoints, 'data'):
-        if r.keypoints.data.shape[0] > 0:
-            kp = r.keypoints.data[0].cpu().numpy()
-            img_rgb_copy = draw_pose(img_rgb_copy, kp)
-            pose_data = kp.flatten()
-            pose_len = min(len(pose_data), POSE_DIM)
-            pose[:pose_len] = torch.tensor(pose_data[:pose_len], dtype=torch.float32)
-    
-    # Make prediction
-    img_tensor = _transform(image).unsqueeze(0).to(DEVICE)
-    pose_tensor = pose.unsqueeze(0).to(DEVICE)
-    
-    with torch.no_grad():
-        prob = torch.sigmoid(model(img_tensor, pose_tensor)).item()
-    
+def draw_prediction(image, prob, threshold=0.5, box_coords=None):
+    """Draws the prediction label above the person box, or top-left if there is none."""
     pred = 1 if prob > threshold else 0
     pred_text = "Shoplifting" if pred == 1 else "Normal"
     
@@ -143,16 +191,54 @@ def visualize_image(image: Image.Image, threshold: float = 0.5) -> Image.Image:
         text_y = max(y1 - 10, text_height + 10)  # Above box, but at least 10px from top
         
         # Draw background rectangle for text
-        cv2.rectangle(img_rgb_copy, 
+        cv2.rectangle(image, 
                      (text_x - 5, text_y - text_height - 5), 
                      (text_x + text_width + 5, text_y + baseline + 5), 
                      (0, 0, 0), -1)  # Black background
         
         # Draw text
-        cv2.putText(img_rgb_copy, text, (text_x, text_y), font, font_scale, text_color, thickness, cv2.LINE_AA)
+        cv2.putText(image, text, (text_x, text_y), font, font_scale, text_color, thickness, cv2.LINE_AA)
     else:
         # Fallback: place at top-left if no bounding box
-        cv2.putText(img_rgb_copy, text, (10, 30), font, font_scale, text_color, thickness, cv2.LINE_AA)
+        cv2.putText(image, text, (10, 30), font, font_scale, text_color, thickness, cv2.LINE_AA)
+    return image
+
+def visualize_image(image: Image.Image, threshold: float = 0.5) -> Image.Image:
+    """
+    Visualize image with pose keypoints, skeleton, bounding boxes, and prediction.
+    Returns a PIL Image with the visualization overlay.
+    """
+    pose_model, model = _load_models()
+    
+    # Convert PIL to OpenCV format
+    img_array = np.array(image.convert('RGB'))
+    img_rgb_copy = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+    
+    # Run pose detection on the BGR array (YOLO's native NumPy layout), before drawing on it
+    with stage("pose"):
+        r = pose_model(img_rgb_copy, verbose=False, device='cpu')[0]
+    
+    # Draw bounding boxes and get box coordinates for text placement
+    box_coords = None
+    if r.boxes is not None and len(r.boxes) > 0:
+        box = r.boxes.xyxy[0].cpu().numpy()
+        x1, y1, x2, y2 = map(int, box)
+        cv2.rectangle(img_rgb_copy, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        box_coords = (x1, y1, x2, y2)
+    
+    # Extract and draw keypoints
+    poses = poses_from_results([r])
+    if r.keypoints is not None and r.keypoints.data.shape[0] > 0:
+        img_rgb_copy = draw_pose(img_rgb_copy, r.keypoints.data[0].cpu().numpy())
+    
+    # Make prediction
+    with stage("transform"):
+        img_tensor = frames_to_tensor([img_array])
+    
+    prob = _score(model, img_tensor, poses)[0]
+    
+    with stage("overlay"):
+        img_rgb_copy = draw_prediction(img_rgb_copy, prob, threshold, box_coords)
     
     # Convert back to RGB and PIL Image
     img_rgb_result = cv2.cvtColor(img_rgb_copy, cv2.COLOR_BGR2RGB)
@@ -0,0 +1,198 @@
+"""
+Lightweight in-process metrics, exposed in Prometheus text format on /metrics.
+
+Recording a value takes a lock, a bisect and a few additions, so the
+instrumentation can stay on in production. Values are per process: each uvicorn
+worker serves its own /metrics.
+"""
+import bisect, cProfile, os, random, threading, time
+from contextlib import contextmanager
+
+from config import *
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FPS_BUCKETS = (1, 2, 5, 10, 15, 20, 30, 60, 120)
+
+_registry = []
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels[n]) for n in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_fmt_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        # Non-cumulative counts per bucket; the last slot is +Inf
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][idx] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        for key, (counts, total, n) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                cumulative += c
+                le = _fmt_labels(self.label_names, key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            base = _fmt_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{base} {total}")
+            lines.append(f"{self.name}_count{base} {n}")
+        return lines
+
+
+def render_metrics():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# =====================================================
+# METRICS
+# =====================================================
+STAGE_SECONDS = Histogram(
+    "shoplift_stage_seconds", "Latency of each inference stage", labels=("stage",)
+)
+REQUEST_SECONDS = Histogram(
+    "shoplift_request_seconds", "End-to-end HTTP request latency", labels=("endpoint", "status")
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "shoplift_requests_in_flight", "Requests accepted but not yet answered (queue depth)"
+)
+MODEL_LOAD_SECONDS = Gauge(
+    "shoplift_model_load_seconds", "Time taken to load each model", labels=("model",)
+)
+VIDEO_FPS = Histogram(
+    "shoplift_video_fps", "Decoded frames per second for video jobs", buckets=FPS_BUCKETS
+)
+CASCADE_FRAMES = Counter(
+    "shoplift_cascade_frames_total", "Cascaded frames by path (full model vs skipped)",
+    labels=("path",),
+)
+INFERENCE_ERRORS = Counter(
+    "shoplift_inference_errors_total", "Failed video inference calls by scope (batch/frame)",
+    labels=("scope",),
+)
+
+
+def stage(name):
+    """Context manager timing one hot-path stage into shoplift_stage_seconds.
+
+    On CUDA, kernels run asynchronously, so GPU time is attributed to the stage that
+    next synchronizes. In the predict path that is the fusion stage, which copies the
+    probabilities to the host: it includes the backbone's GPU time, and the backbone
+    stage only records kernel launches.
+    """
+    return STAGE_SECONDS.time(stage=name)
+
+
+# =====================================================
+# OPT-IN REQUEST PROFILER
+# =====================================================
+_profiling = threading.Lock()
+
+
+def should_profile(headers):
+    """Sample PROFILE_SAMPLE_RATE of requests, plus any sending X-Profile when allowed"""
+    if PROFILE_ALLOW_HEADER and headers.get("x-profile") == "1":
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+@contextmanager
+def profile_request(name):
+    """cProfile one request and dump the stats to PROFILE_DIR.
+
+    Only one request is profiled at a time; if another is already being
+    profiled this is a no-op. Other coroutines running on the same event loop
+    while the request is in flight also show up in the profile.
+    """
+    if not _profiling.acquire(blocking=False):
+        yield
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        safe = name.strip("/").replace("/", "_") or "root"
+        profiler.dump_stats(os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}_{safe}.prof"))
+    finally:
+        _profiling.release()
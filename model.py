@@ -3,63 +3,94 @@ import torch.nn as nn
 from torchvision import models
 from config import *
 
+# name -> (torchvision constructor, ImageNet weights)
+BACKBONES = {
+    "resnet50": (models.resnet50, models.ResNet50_Weights.DEFAULT),
+    "resnet18": (models.resnet18, models.ResNet18_Weights.DEFAULT),
+    "mobilenet_v3_large": (models.mobilenet_v3_large, models.MobileNet_V3_Large_Weights.DEFAULT),
+    "mobilenet_v3_small": (models.mobilenet_v3_small, models.MobileNet_V3_Small_Weights.DEFAULT),
+}
+
+def build_backbone(name, pretrained=True):
+    """Returns (feature extractor ending in global average pooling, feature dim)"""
+    if name not in BACKBONES:
+        raise ValueError(f"Unknown backbone {name!r}; choose from {sorted(BACKBONES)}")
+    ctor, weights = BACKBONES[name]
+    net = ctor(weights=weights if pretrained else None)
+    if name.startswith("resnet"):
+        # Same layout as the original ResNet-50 stream, so old checkpoints still load
+        return nn.Sequential(*list(net.children())[:-1]), net.fc.in_features
+    return nn.Sequential(net.features, net.avgpool), net.classifier[0].in_features
+
 class DualStreamTransformerFusion(nn.Module):
-    def __init__(self):
+    def __init__(
+        self,
+        pretrained=True,
+        backbone=BACKBONE,
+        d_model=D_MODEL,
+        layers=TRANSFORMER_LAYERS,
+        heads=TRANSFORMER_HEADS,
+        ff_dim=TRANSFORMER_FF_DIM,
+    ):
         super().__init__()
+        # Saved alongside the weights so a checkpoint can rebuild its own architecture
+        self.arch = dict(backbone=backbone, d_model=d_model, layers=layers, heads=heads, ff_dim=ff_dim)
 
-        resnet = models.resnet50(weights=models.ResNet50_Weights.DEFAULT)
-        self.image_backbone = nn.Sequential(*list(resnet.children())[:-1])
-        self.image_feat_dim = resnet.fc.in_features
+        # pretrained=False skips the ImageNet download when a checkpoint is loaded afterwards
+        self.image_backbone, self.image_feat_dim = build_backbone(backbone, pretrained)
 
         self.image_proj = nn.Sequential(
-            nn.Linear(self.image_feat_dim, D_MODEL),
-            nn.LayerNorm(D_MODEL),
+            nn.Linear(self.image_feat_dim, d_model),
+            nn.LayerNorm(d_model),
             nn.ReLU(),
             nn.Dropout(DROPOUT),
         )
 
         self.pose_mlp = nn.Sequential(
-            nn.Linear(POSE_DIM, D_MODEL),
-            nn.LayerNorm(D_MODEL),
+            nn.Linear(POSE_DIM, d_model),
+            nn.LayerNorm(d_model),
             nn.ReLU(),
             nn.Dropout(DROPOUT),
         )
 
-        self.token_pos_embed = nn.Embedding(2, D_MODEL)
+        self.token_pos_embed = nn.Embedding(2, d_model)
 
         encoder_layer = nn.TransformerEncoderLayer(
-            d_model=D_MODEL,
-            nhead=TRANSFORMER_HEADS,
-            dim_feedforward=TRANSFORMER_FF_DIM,
+            d_model=d_model,
+            nhead=heads,
+            dim_feedforward=ff_dim,
             dropout=DROPOUT,
             batch_first=True,
             activation="gelu",
         )
         self.transformer = nn.TransformerEncoder(
-            encoder_layer, num_layers=TRANSFORMER_LAYERS
+            encoder_layer, num_layers=layers
         )
 
         self.gate = nn.Sequential(
-            nn.Linear(D_MODEL * 2, D_MODEL),
-            nn.LayerNorm(D_MODEL),
+            nn.Linear(d_model * 2, d_model),
+            nn.LayerNorm(d_model),
             nn.Sigmoid(),
         )
 
         self.cls_head = nn.Sequential(
-            nn.LayerNorm(D_MODEL),
+            nn.LayerNorm(d_model),
             nn.Dropout(DROPOUT),
-            nn.Linear(D_MODEL, D_MODEL // 2),
+            nn.Linear(d_model, d_model // 2),
             nn.GELU(),
             nn.Dropout(DROPOUT),
-            nn.utils.weight_norm(nn.Linear(D_MODEL // 2, 1)),
+            nn.utils.weight_norm(nn.Linear(d_model // 2, 1)),
         )
 
         nn.init.normal_(self.cls_head[-1].weight_g, std=0.05)
 
-    def forward(self, images, poses):
+    def encode_image(self, images):
+        """Image stream only: (B, 3, H, W) -> pooled backbone features (B, image_feat_dim)"""
         B = images.size(0)
+        return self.image_backbone(images).view(B, -1)
 
-        img_feat = self.image_backbone(images).view(B, -1)
+    def fuse(self, img_feat, poses):
+        """Fusion head: backbone features + pose vectors -> logits (B, 1)"""
         img_tok = self.image_proj(img_feat)
 
         pose_tok = self.pose_mlp(poses)
@@ -75,3 +106,42 @@ class DualStreamTransformerFusion(nn.Module):
         pooled = g * t_img + (1 - g) * t_pose
 
         return self.cls_head(pooled)
+
+    def forward(self, images, poses):
+        return self.fuse(self.encode_image(images), poses)
+
+
+def save_checkpoint(model, path):
+    torch.save({"arch": model.arch, "state_dict": model.state_dict()}, path)
+
+def load_checkpoint(path, map_location=DEVICE):
+    """
+    Rebuild a DualStreamTransformerFusion from a save_checkpoint file, or from a bare
+    state_dict (older checkpoints), which is assumed to match the config.py architecture.
+    """
+    ckpt = torch.load(path, map_location=map_location)
+    arch = {}
+    if isinstance(ckpt, dict) and "state_dict" in ckpt and "arch" in ckpt:
+        arch, ckpt = ckpt["arch"], ckpt["state_dict"]
+    model = DualStreamTransformerFusion(pretrained=False, **arch)
+    model.load_state_dict(ckpt)
+    return model.to(map_location).eval()
+
+
+class PoseGate(nn.Module):
+    """
+    Pose-only pre-filter for cascaded inference. Trained by distillation from
+    DualStreamTransformerFusion (see train.py --pose-gate) to predict the full
+    model's score from keypoints alone.
+    """
+    def __init__(self, hidden=64):
+        super().__init__()
+        self.net = nn.Sequential(
+            nn.LayerNorm(POSE_DIM),
+            nn.Linear(POSE_DIM, hidden),
+            nn.ReLU(),
+            nn.Linear(hidden, 1),
+        )
+
+    def forward(self, poses):
+        return self.net(poses)
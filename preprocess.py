@@ -0,0 +1,92 @@
+"""
+Batched preprocessing shared by inference, the dataset and the video path.
+
+Frames stay uint8 NumPy until a single copy into a reusable host buffer. That buffer
+is pinned when running on CUDA. Resize is done with cv2. Normalisation happens
+in-place on the float tensor, so no PIL round-trip is needed.
+"""
+import threading
+
+import cv2
+import numpy as np
+import torch
+
+from config import *
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+_local = threading.local()
+
+
+def _host_buffer(n, pinned):
+    """Per-thread uint8 staging buffer of at least n frames, grown on demand"""
+    buf = getattr(_local, "buffer", None)
+    if buf is None or buf.shape[0] < n or buf.is_pinned() != pinned:
+        buf = torch.empty((n, IMG_SIZE, IMG_SIZE, 3), dtype=torch.uint8, pin_memory=pinned)
+        _local.buffer = buf
+    return buf
+
+
+def _norm_constants(device):
+    consts = getattr(_local, "norm", None)
+    if consts is None or consts[0].device != device:
+        # Fold the /255 of ToTensor into the mean/std
+        mean = torch.tensor(IMAGENET_MEAN, device=device).view(1, 3, 1, 1) * 255
+        inv_std = 1.0 / (torch.tensor(IMAGENET_STD, device=device).view(1, 3, 1, 1) * 255)
+        consts = _local.norm = (mean, inv_std)
+    return consts
+
+
+def frames_to_tensor(frames, bgr=False, device=DEVICE):
+    """
+    uint8 HxWx3 frames (any size) -> normalized float tensor (N, 3, IMG_SIZE, IMG_SIZE).
+    Equivalent to Resize + ToTensor + Normalize. INTER_AREA stands in for PIL's
+    antialiased downscale. Pass bgr=True for frames straight from cv2.
+    """
+    device = torch.device(device)
+    n = len(frames)
+    # The previous call's async host-to-device copy may still be reading the buffer
+    copy_done = getattr(_local, "copy_done", None)
+    if copy_done is not None:
+        copy_done.synchronize()
+        _local.copy_done = None
+    # Pin only when copying to CUDA (e.g. not inside CPU DataLoader workers)
+    host = _host_buffer(n, pinned=(device.type == "cuda"))
+    host_np = host.numpy()
+    for i, frame in enumerate(frames):
+        cv2.resize(frame, (IMG_SIZE, IMG_SIZE), dst=host_np[i], interpolation=cv2.INTER_AREA)
+        if bgr:
+            cv2.cvtColor(host_np[i], cv2.COLOR_BGR2RGB, dst=host_np[i])
+
+    x = host[:n].to(device, non_blocking=True)
+    if device.type == "cuda":
+        _local.copy_done = torch.cuda.Event()
+        _local.copy_done.record()
+    out = torch.empty((n, 3, IMG_SIZE, IMG_SIZE), dtype=torch.float32, device=device)
+    out.copy_(x.permute(0, 3, 1, 2))  # NHWC uint8 -> NCHW float in one pass
+    mean, inv_std = _norm_constants(out.device)
+    return out.sub_(mean).mul_(inv_std)
+
+
+def has_person(result):
+    return result.keypoints is not None and result.keypoints.data.shape[0] > 0
+
+
+def poses_from_results(results, scale=None):
+    """
+    YOLO pose results -> (N, POSE_DIM) float tensor with the first detected person's
+    flattened (x, y, conf) keypoints, or zeros for frames with nobody in them.
+    scale: optional per-frame factor mapping x, y back to the original resolution
+    when pose ran on downscaled frames.
+    """
+    poses = torch.zeros(len(results), POSE_DIM, dtype=torch.float32)
+    idx = [i for i, r in enumerate(results) if has_person(r)]
+    if idx:
+        kps = torch.stack([results[i].keypoints.data[0].reshape(-1)[:POSE_DIM] for i in idx])
+        poses[:, :kps.shape[1]].index_copy_(0, torch.tensor(idx), kps.float().cpu())
+        if scale is not None:
+            s = torch.as_tensor(scale, dtype=torch.float32).view(-1, 1)
+            poses[:, 0::3] *= s
+            poses[:, 1::3] *= s
+    return poses
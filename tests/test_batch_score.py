@@ -0,0 +1,97 @@
+"""Worker-side downscaling, segment planning and resume safety of batch_score.py."""
+import json
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("torch")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+pytest.importorskip("tqdm")
+
+import batch_score
+from batch_score import _downscale, decode_task, eof_id, plan_units, read_checkpoint, unit_id
+
+PARAMS = {"frame_skip": 5, "segment": 30, "max_side": 640,
+          "threshold": 0.5, "cascade": False, "format": "jsonl"}
+
+
+def test_downscale_caps_long_side_and_reports_scale():
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+    small, scale = _downscale(frame, 640)
+    assert small.shape == (360, 640, 3)
+    assert scale == pytest.approx(3.0)
+
+
+def test_downscale_leaves_small_frames_alone():
+    frame = np.zeros((480, 640, 3), dtype=np.uint8)
+    same, scale = _downscale(frame, 640)
+    assert same is frame and scale == 1.0
+
+
+def test_resume_reads_units_when_params_match(tmp_path):
+    ckpt = tmp_path / "scores.jsonl.ckpt"
+    ckpt.write_text(json.dumps({"params": PARAMS}) + "\na.jpg\nclip.mp4#150\n")
+    assert read_checkpoint(str(ckpt), PARAMS) == {"a.jpg", "clip.mp4#150"}
+
+
+@pytest.mark.parametrize("header", [json.dumps({"params": dict(PARAMS, frame_skip=25)}), "a.jpg"])
+def test_resume_refuses_mismatched_or_unversioned_checkpoint(tmp_path, header):
+    ckpt = tmp_path / "scores.jsonl.ckpt"
+    ckpt.write_text(header + "\nclip.mp4#150\n")
+    with pytest.raises(SystemExit):
+        read_checkpoint(str(ckpt), PARAMS)
+
+
+N_FRAMES = 25
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for i in range(N_FRAMES):
+        writer.write(np.full((48, 64, 3), i * 10 % 256, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def test_decode_task_caps_segments_and_reports_eof(video):
+    frames, _, metas, error, eof = decode_task(("video", video, 0, 10, 25.0), frame_skip=2)
+    assert error is None and not eof
+    assert [m["frame_index"] for m in metas] == [0, 2, 4, 6, 8] and len(frames) == 5
+    _, _, metas, _, eof = decode_task(("video", video, 20, 30, 25.0), frame_skip=2)
+    assert eof and [m["frame_index"] for m in metas] == [20, 22, 24]
+
+
+def test_plan_units_continues_through_resumed_follow_ons(video):
+    # The 25-frame estimate plans 0/10/20; earlier follow-ons 30 and 40 were already done
+    done = {f"{video}#{s}" for s in (0, 10, 20, 30)}
+    starts = [t[2] for t in plan_units([], [video], frame_skip=2, segment=5, done=done)]
+    assert starts == [0, 10, 20, 30, 40]
+    done.add(eof_id(video))
+    starts = [t[2] for t in plan_units([], [video], frame_skip=2, segment=5, done=done)]
+    assert starts == [0, 10, 20]
+
+
+def test_short_frame_count_is_followed_to_eof(video, tmp_path, monkeypatch):
+    # Emulate a container reporting no frame count: only the first segment is planned
+    plan = batch_score.plan_units
+    monkeypatch.setattr(batch_score, "plan_units",
+                        lambda *a, **k: (t for t in plan(*a, **k) if t[0] != "video" or t[2] == 0))
+    monkeypatch.setattr(batch_score, "predict_frames", lambda frames, **kw: [0.5] * len(frames))
+    output = str(tmp_path / "scores.jsonl")
+    kwargs = dict(workers=1, frame_skip=2, segment=4, batch_size=3)
+
+    batch_score.score([video], output, **kwargs)
+    with open(output) as f:
+        rows = [json.loads(line) for line in f]
+    assert [r["frame_index"] for r in rows] == list(range(0, N_FRAMES, 2))
+    with open(output + ".ckpt") as f:
+        ids = [line.strip() for line in f][1:]
+    assert eof_id(video) in ids and unit_id(("video", video, 24)) in ids
+
+    # Nothing is left to do on resume
+    batch_score.score([video], output, resume=True, **kwargs)
+    with open(output) as f:
+        assert sum(1 for _ in f) == len(rows)
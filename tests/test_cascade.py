@@ -0,0 +1,90 @@
+"""Cascaded inference (cascade_mask / predict_frames) with stub YOLO results and models."""
+import math
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+import inference
+
+FULL_PROB = 0.9
+
+
+def _person():
+    return SimpleNamespace(keypoints=SimpleNamespace(data=torch.rand(1, 17, 3) * 100))
+
+
+def _nobody():
+    return SimpleNamespace(keypoints=SimpleNamespace(data=torch.zeros(0, 17, 3)))
+
+
+class StubPoseModel:
+    """Returns canned results instead of running YOLO"""
+    def __init__(self, results):
+        self.results = results
+
+    def __call__(self, frames, **kwargs):
+        assert len(frames) == len(self.results)
+        return self.results
+
+
+class StubFusion:
+    """Scores every frame FULL_PROB and records how many frames reached the image stream"""
+    def __init__(self):
+        self.seen = 0
+
+    def encode_image(self, images):
+        self.seen += images.shape[0]
+        return images.mean(dim=(1, 2, 3)).unsqueeze(1)
+
+    def fuse(self, img_feat, poses):
+        return torch.full((img_feat.shape[0], 1), math.log(FULL_PROB / (1 - FULL_PROB)))
+
+
+@pytest.fixture
+def no_gate(monkeypatch):
+    monkeypatch.setattr(inference, "_pose_gate", None)
+    monkeypatch.setattr(inference, "_pose_gate_checked", True)
+
+
+def _run(monkeypatch, results, threshold=0.1):
+    fusion = StubFusion()
+    monkeypatch.setattr(inference, "_load_models", lambda: (StubPoseModel(results), fusion))
+    frames = [np.zeros((48, 64, 3), dtype=np.uint8) for _ in results]
+    return inference.predict_frames(frames, cascade=True, threshold=threshold), fusion
+
+
+def test_no_person_frames_skip_the_full_model(monkeypatch, no_gate):
+    probs, fusion = _run(monkeypatch, [_nobody(), _person(), _nobody()])
+    assert fusion.seen == 1
+    assert probs[0] == 0.0 and probs[2] == 0.0
+    assert probs[1] == pytest.approx(FULL_PROB)
+
+
+def test_gate_below_threshold_keeps_cheap_score(monkeypatch):
+    # Gate logits: -3 -> 0.047 (below the 0.1 threshold), +3 -> 0.95 (passes)
+    gate = lambda poses: torch.tensor([[-3.0], [3.0]])
+    monkeypatch.setattr(inference, "_pose_gate", gate)
+    monkeypatch.setattr(inference, "_pose_gate_checked", True)
+    probs, fusion = _run(monkeypatch, [_person(), _person()], threshold=0.1)
+    assert fusion.seen == 1
+    assert probs[0] == pytest.approx(torch.sigmoid(torch.tensor(-3.0)).item())
+    assert probs[1] == pytest.approx(FULL_PROB)
+
+
+def test_corrupt_gate_falls_back_to_person_only_skipping(monkeypatch, tmp_path):
+    bad = tmp_path / "pose_gate.pth"
+    bad.write_bytes(b"not a checkpoint")
+    monkeypatch.setattr(inference, "POSE_GATE_WEIGHTS_PATH", str(bad))
+    monkeypatch.setattr(inference, "_pose_gate", None)
+    monkeypatch.setattr(inference, "_pose_gate_checked", False)
+
+    assert inference._load_pose_gate() is None
+    results = [_nobody(), _person()]
+    run_full, cheap = inference.cascade_mask(results, torch.zeros(2, inference.POSE_DIM))
+    assert run_full.tolist() == [False, True]
+    assert cheap.tolist() == [0.0, 0.0]
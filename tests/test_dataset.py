@@ -0,0 +1,34 @@
+"""Directory scanning used by ShopliftDataset and batch_score.py."""
+import os
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("cv2")
+pytest.importorskip("ultralytics")
+
+from dataset import list_images, list_videos
+
+
+def _touch(*parts):
+    path = os.path.join(*parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+    return path
+
+
+def test_scan_is_case_insensitive(tmp_path):
+    root = str(tmp_path)
+    expected = [_touch(root, "a.jpg"), _touch(root, "B.JPG"), _touch(root, "c.Png")]
+    _touch(root, "notes.txt")
+    _touch(root, ".hidden.jpg")
+    assert list_images(root) == sorted(expected)
+
+
+def test_scan_recursive_only_when_asked(tmp_path):
+    root = str(tmp_path)
+    top = _touch(root, "clip.MP4")
+    nested = _touch(root, "day1", "cam2", "clip.mov")
+    _touch(root, ".cache", "skipped.mp4")
+    assert list_videos(root) == [top]
+    assert list_videos(root, recursive=True) == sorted([top, nested])
@@ -0,0 +1,49 @@
+"""Checkpoint compatibility of model.py: bare state_dicts and self-describing checkpoints."""
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("torchvision")
+
+from config import BACKBONE, D_MODEL, POSE_DIM
+from model import DualStreamTransformerFusion, build_backbone, load_checkpoint, save_checkpoint
+
+
+def _inputs():
+    g = torch.Generator().manual_seed(0)
+    return torch.randn(2, 3, 64, 64, generator=g), torch.randn(2, POSE_DIM, generator=g)
+
+
+def _assert_same_outputs(a, b):
+    images, poses = _inputs()
+    with torch.no_grad():
+        assert torch.allclose(a.eval()(images, poses), b.eval()(images, poses), atol=1e-6)
+
+
+def test_bare_state_dict_loads_as_config_architecture(tmp_path):
+    torch.manual_seed(0)
+    model = DualStreamTransformerFusion(pretrained=False)
+    path = tmp_path / "old_format.pth"
+    torch.save(model.state_dict(), path)
+
+    loaded = load_checkpoint(str(path), map_location="cpu")
+    assert loaded.arch["backbone"] == BACKBONE and loaded.arch["d_model"] == D_MODEL
+    _assert_same_outputs(model, loaded)
+
+
+def test_save_checkpoint_round_trips_student_architecture(tmp_path):
+    torch.manual_seed(0)
+    arch = dict(backbone="mobilenet_v3_small", d_model=256, layers=1, heads=4, ff_dim=512)
+    model = DualStreamTransformerFusion(pretrained=False, **arch)
+    path = tmp_path / "student.pth"
+    save_checkpoint(model, str(path))
+
+    saved = torch.load(path, map_location="cpu")
+    assert set(saved) == {"arch", "state_dict"}
+    loaded = load_checkpoint(str(path), map_location="cpu")
+    assert loaded.arch == arch
+    _assert_same_outputs(model, loaded)
+
+
+def test_unknown_backbone_is_rejected():
+    with pytest.raises(ValueError):
+        build_backbone("vgg16", pretrained=False)
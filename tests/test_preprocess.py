@@ -0,0 +1,77 @@
+"""frames_to_tensor (cv2, used by training and serving) against the torchvision PIL chain."""
+from types import SimpleNamespace
+
+import pytest
+
+np = pytest.importorskip("numpy")
+torch = pytest.importorskip("torch")
+cv2 = pytest.importorskip("cv2")
+pytest.importorskip("torchvision")
+
+from PIL import Image
+from torchvision import transforms
+
+from config import IMG_SIZE, POSE_DIM
+from preprocess import IMAGENET_MEAN, IMAGENET_STD, frames_to_tensor, poses_from_results
+
+# Tolerance in normalized units (1 / 255 / std ~= 0.017 per gray level). INTER_AREA and
+# PIL's antialiased bilinear filter differ slightly, so downscales agree to ~1 gray level
+# on average and ~6 in the worst pixel; an exact-size input must match to float precision.
+MEAN_ABS_TOL = 0.02
+MAX_ABS_TOL = 0.1
+
+reference = transforms.Compose([
+    transforms.Resize((IMG_SIZE, IMG_SIZE)),
+    transforms.ToTensor(),
+    transforms.Normalize(IMAGENET_MEAN, IMAGENET_STD),
+])
+
+
+def _smooth_frame(h, w, seed):
+    """Gradients plus low-frequency waves: representative of camera frames, no aliasing"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:h, 0:w].astype(np.float32)
+    channels = []
+    for _ in range(3):
+        fx, fy, phase = rng.uniform(1, 3), rng.uniform(1, 3), rng.uniform(0, np.pi)
+        c = 127 + 60 * np.sin(2 * np.pi * (fx * x / w + fy * y / h) + phase) + 60 * (x / w - y / h)
+        channels.append(c)
+    return np.clip(np.stack(channels, axis=-1), 0, 255).astype(np.uint8)
+
+
+def _reference(frames_rgb):
+    return torch.stack([reference(Image.fromarray(f)) for f in frames_rgb])
+
+
+@pytest.mark.parametrize("size", [(480, 640), (720, 1280), (300, 300)])
+def test_matches_torchvision_within_tolerance(size):
+    frames = [_smooth_frame(*size, seed) for seed in range(3)]
+    ours = frames_to_tensor(frames, device="cpu")
+    ref = _reference(frames)
+    assert ours.shape == ref.shape == (3, 3, IMG_SIZE, IMG_SIZE)
+    diff = (ours - ref).abs()
+    assert diff.mean().item() <= MEAN_ABS_TOL
+    assert diff.max().item() <= MAX_ABS_TOL
+
+
+def test_exact_size_is_identical():
+    frame = np.random.default_rng(0).integers(0, 256, (IMG_SIZE, IMG_SIZE, 3), dtype=np.uint8)
+    ours = frames_to_tensor([frame], device="cpu")
+    assert torch.allclose(ours, _reference([frame]), atol=1e-5)
+
+
+def test_bgr_flag_swaps_channels():
+    frame = _smooth_frame(480, 640, 7)
+    rgb = frames_to_tensor([frame], device="cpu")
+    bgr = frames_to_tensor([np.ascontiguousarray(frame[..., ::-1])], bgr=True, device="cpu")
+    assert torch.allclose(rgb, bgr)
+
+
+def test_poses_from_results_zero_fills_empty_frames():
+    kp = torch.arange(17 * 3, dtype=torch.float32).reshape(1, 17, 3)
+    person = SimpleNamespace(keypoints=SimpleNamespace(data=kp))
+    nobody = SimpleNamespace(keypoints=SimpleNamespace(data=torch.zeros(0, 17, 3)))
+    poses = poses_from_results([nobody, person, SimpleNamespace(keypoints=None)])
+    assert poses.shape == (3, POSE_DIM)
+    assert not poses[0].any() and not poses[2].any()
+    assert torch.equal(poses[1], kp.reshape(-1)[:POSE_DIM])
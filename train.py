@@ -1,12 +1,16 @@
-from model import DualStreamTransformerFusion
+from model import DualStreamTransformerFusion, PoseGate, save_checkpoint, load_checkpoint
 from dataset import ShopliftDataset
 from config import *
 from data import download_roboflow_dataset
 
-import torch, os
+import torch, os, time, argparse
 import torch.nn as nn
-from torch.utils.data import DataLoader
-from torchvision import transforms
+from contextlib import nullcontext
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel as DDP
+from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data.distributed import DistributedSampler
 from torch.optim import AdamW
 from tqdm import tqdm
 
@@ -38,38 +42,150 @@ class EMA:
         model.load_state_dict(self.shadow)
 
 
-def train():
-    # =====================================================
-    # 1. DATASET
-    # =====================================================
+class DistillationLoss(nn.Module):
+    """
+    Hinton-style distillation for a binary logit: alpha * BCE against the labels
+    plus (1 - alpha) * T^2 * BCE against the teacher's temperature-softened probabilities.
+    """
+    def __init__(self, alpha=DISTILL_ALPHA, temperature=DISTILL_TEMPERATURE):
+        super().__init__()
+        self.alpha = alpha
+        self.temperature = temperature
+        self.bce = nn.BCEWithLogitsLoss()
+
+    def forward(self, logits, labels, teacher_logits):
+        T = self.temperature
+        hard = self.bce(logits, labels)
+        soft = self.bce(logits / T, torch.sigmoid(teacher_logits / T))
+        return self.alpha * hard + (1 - self.alpha) * T * T * soft
+
+
+# =====================================================
+# DISTRIBUTED HELPERS
+# =====================================================
+def setup_distributed(rank, world_size):
+    """Join the process group and split the CPU cores between ranks"""
+    os.environ.setdefault("MASTER_ADDR", DIST_MASTER_ADDR)
+    os.environ.setdefault("MASTER_PORT", str(DIST_MASTER_PORT))
+    dist.init_process_group(DIST_BACKEND, rank=rank, world_size=world_size)
+    # Without this every rank spawns one intra-op thread per core and they thrash.
+    # Split by the ranks on this node (torchrun sets LOCAL_WORLD_SIZE), not the global count.
+    local_world_size = int(os.environ.get("LOCAL_WORLD_SIZE", world_size))
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // local_world_size))
+
+
+def cleanup_distributed():
+    if dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def all_reduce_sum(values):
+    """Sum a list of Python numbers across all ranks (no-op when not distributed)"""
+    t = torch.tensor(values, dtype=torch.float64)
+    if dist.is_initialized():
+        dist.all_reduce(t, op=dist.ReduceOp.SUM)
+    return t.tolist()
+
+
+# =====================================================
+# PRECISION / STEP HELPERS
+# =====================================================
+def autocast_settings(precision=PRECISION):
+    """Resolve a PRECISION value into (device_type, dtype, enabled) for torch.autocast"""
+    device_type = DEVICE.type
+    if precision == "auto":
+        precision = "fp16" if device_type == "cuda" else "bf16"
+    if precision == "fp16" and device_type != "cuda":
+        raise ValueError("fp16 autocast is only supported on CUDA; use bf16 on CPU")
+    dtype = {"fp32": torch.float32, "bf16": torch.bfloat16, "fp16": torch.float16}[precision]
+    return device_type, dtype, precision != "fp32"
+
+
+def train_step(model, imgs, poses, labels, criterion, scaler, amp, accum_steps=1, sync=True, teacher=None):
+    """
+    Forward/backward one micro-batch. Gradients are all-reduced only when `sync` is set.
+    With a teacher, `criterion` is a DistillationLoss and also gets the teacher's logits.
+    """
+    device_type, dtype, enabled = amp
+    # Skip the DDP all-reduce on all but the last micro-batch of an accumulation group
+    ddp = getattr(model, "_orig_mod", model)  # look through torch.compile's wrapper
+    ctx = ddp.no_sync() if (not sync and isinstance(ddp, DDP)) else nullcontext()
+    with ctx:
+        with torch.autocast(device_type=device_type, dtype=dtype, enabled=enabled):
+            logits = model(imgs, poses)
+            if teacher is not None:
+                with torch.no_grad():
+                    teacher_logits = teacher(imgs, poses)
+        # Loss in fp32 regardless of autocast dtype
+        if teacher is None:
+            loss = criterion(logits.float(), labels)
+        else:
+            loss = criterion(logits.float(), labels, teacher_logits.float())
+        scaler.scale(loss / accum_steps).backward()
+    return loss
+
+
+def optimizer_step(model, optimizer, scaler):
+    scaler.unscale_(optimizer)
+    nn.utils.clip_grad_norm_(model.parameters(), 2.0)
+
+    scaler.step(optimizer)
+    scaler.update()
+    optimizer.zero_grad(set_to_none=True)
+
+
+def resolve_dataset_dirs():
     # Check if local dataset exists first
     local_train_dir = "FYP-Shoplift-1/train/images"
     local_valid_dir = "FYP-Shoplift-1/valid/images"
-    
-    import os
+
     if os.path.exists(local_train_dir) and os.path.exists(local_valid_dir):
         print(f"Using local dataset: {local_train_dir}, {local_valid_dir}")
-        train_dir, valid_dir = local_train_dir, local_valid_dir
+        return local_train_dir, local_valid_dir
+
+    print("Local dataset not found, downloading from Roboflow...")
+    return download_roboflow_dataset()
+
+
+def train(rank=0, world_size=1, distill=False, datasets=None, model_fn=None,
+          epochs=EPOCHS, out_path=None):
+    """
+    Train the fusion model. With distill=True, train the smaller STUDENT_* architecture
+    against the trained model at MODEL_WEIGHTS_PATH as teacher, and save it to
+    STUDENT_WEIGHTS_PATH.
+
+    datasets=(train_ds, val_ds), model_fn and out_path replace the Roboflow data, the
+    fusion model and the checkpoint path (used by the multi-process smoke test).
+    """
+    distributed = world_size > 1
+    is_main = rank == 0
+    if distributed:
+        setup_distributed(rank, world_size)
+
+    # =====================================================
+    # 1. DATASET
+    # =====================================================
+    if datasets is not None:
+        train_ds, val_ds = datasets
     else:
-        print("Local dataset not found, downloading from Roboflow...")
-        train_dir, valid_dir = download_roboflow_dataset()
+        # Only rank 0 may download; the other ranks receive the resolved paths
+        dirs = [resolve_dataset_dirs() if is_main else None]
+        if distributed:
+            dist.broadcast_object_list(dirs, src=0)
+        train_dir, valid_dir = dirs[0]
 
-    transform = transforms.Compose([
-        transforms.Resize((IMG_SIZE, IMG_SIZE)),
-        transforms.ToTensor(),
-        transforms.Normalize(
-            [0.485, 0.456, 0.406],
-            [0.229, 0.224, 0.225],
-        ),
-    ])
+        train_ds = ShopliftDataset(train_dir)
+        val_ds   = ShopliftDataset(valid_dir)
 
-    train_ds = ShopliftDataset(train_dir, transform)
-    val_ds   = ShopliftDataset(valid_dir, transform)
+    # Each rank sees a disjoint 1/world_size shard of the data
+    train_sampler = DistributedSampler(train_ds, shuffle=True) if distributed else None
+    val_sampler = DistributedSampler(val_ds, shuffle=False) if distributed else None
 
     train_loader = DataLoader(
         train_ds,
         batch_size=BATCH_SIZE,
-        shuffle=True,
+        shuffle=(train_sampler is None),
+        sampler=train_sampler,
         num_workers=NUM_WORKERS,
         pin_memory=(DEVICE.type == "cuda"),
     )
@@ -78,6 +194,7 @@ def train():
         val_ds,
         batch_size=BATCH_SIZE,
         shuffle=False,
+        sampler=val_sampler,
         num_workers=NUM_WORKERS,
         pin_memory=(DEVICE.type == "cuda"),
     )
@@ -85,56 +202,91 @@ def train():
     # =====================================================
     # 2. MODEL / OPTIM / LOSS
     # =====================================================
-    model = DualStreamTransformerFusion().to(DEVICE)
+    teacher = None
+    if model_fn is not None:
+        raw_model = model_fn().to(DEVICE)
+        out_path = out_path or MODEL_WEIGHTS_PATH
+    elif distill:
+        teacher = load_checkpoint(MODEL_WEIGHTS_PATH, map_location=DEVICE)
+        teacher.requires_grad_(False)
+        raw_model = DualStreamTransformerFusion(
+            backbone=STUDENT_BACKBONE,
+            d_model=STUDENT_D_MODEL,
+            layers=STUDENT_TRANSFORMER_LAYERS,
+            heads=STUDENT_TRANSFORMER_HEADS,
+            ff_dim=STUDENT_TRANSFORMER_FF_DIM,
+        ).to(DEVICE)
+        out_path = out_path or STUDENT_WEIGHTS_PATH
+    else:
+        raw_model = DualStreamTransformerFusion().to(DEVICE)
+        out_path = out_path or MODEL_WEIGHTS_PATH
+    model = DDP(raw_model) if distributed else raw_model
+    if COMPILE_MODEL:
+        model = torch.compile(model)
 
     optimizer = AdamW(model.parameters(), lr=LR, weight_decay=1e-4)
     scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(
-        optimizer, T_max=EPOCHS
+        optimizer, T_max=epochs
     )
 
+    # Validation always reports plain BCE against the labels
     criterion = nn.BCEWithLogitsLoss()
+    train_criterion = DistillationLoss() if distill else criterion
 
-    scaler = torch.cuda.amp.GradScaler(enabled=(DEVICE.type == "cuda"))
-    ema = EMA(model, decay=0.999)
+    amp = autocast_settings()
+    # Loss scaling is only needed for fp16; bf16 has the fp32 exponent range
+    scaler = torch.cuda.amp.GradScaler(enabled=(amp[1] == torch.float16))
+    # EMA shadows the unwrapped weights so saved checkpoints have no "module." prefix
+    ema = EMA(raw_model, decay=0.999) if is_main else None
 
     best_val_loss = float("inf")
 
     # =====================================================
     # 3. TRAINING LOOP
     # =====================================================
-    for epoch in range(EPOCHS):
-        print(f"\n===== Epoch {epoch+1}/{EPOCHS} =====")
+    for epoch in range(epochs):
+        if is_main:
+            print(f"\n===== Epoch {epoch+1}/{epochs} =====")
 
         # -----------------------------
         # TRAIN
         # -----------------------------
         model.train()
+        if train_sampler is not None:
+            train_sampler.set_epoch(epoch)
         train_loss = 0.0
+        seen = 0
+        epoch_start = time.perf_counter()
 
-        for imgs, poses, labels in tqdm(train_loader, desc="Training"):
+        optimizer.zero_grad(set_to_none=True)
+        n_batches = len(train_loader)
+        for i, (imgs, poses, labels) in enumerate(tqdm(train_loader, desc="Training", disable=not is_main)):
             imgs = imgs.to(DEVICE)
             poses = poses.to(DEVICE)
             labels = labels.to(DEVICE)
 
-            optimizer.zero_grad()
-
-            with torch.amp.autocast(device_type='cuda' if DEVICE.type == "cuda" else 'cpu', enabled=(DEVICE.type == "cuda")):
-                logits = model(imgs, poses)
-                loss = criterion(logits, labels)
-
-            scaler.scale(loss).backward()
-            scaler.unscale_(optimizer)
-            nn.utils.clip_grad_norm_(model.parameters(), 2.0)
-
-            scaler.step(optimizer)
-            scaler.update()
-
-            ema.update(model)
+            # Step every GRAD_ACCUM_STEPS micro-batches, and on the epoch's last batch
+            last_micro = (i + 1) % GRAD_ACCUM_STEPS == 0 or (i + 1) == n_batches
+            # The epoch's final group may be short; average over its real size
+            group_start = i - i % GRAD_ACCUM_STEPS
+            group_size = min(GRAD_ACCUM_STEPS, n_batches - group_start)
+            loss = train_step(
+                model, imgs, poses, labels, train_criterion, scaler, amp,
+                accum_steps=group_size, sync=last_micro, teacher=teacher,
+            )
+
+            if last_micro:
+                optimizer_step(model, optimizer, scaler)
+                if ema is not None:
+                    ema.update(raw_model)
 
             train_loss += loss.item()
+            seen += labels.size(0)
 
         scheduler.step()
-        avg_train_loss = train_loss / len(train_loader)
+        epoch_time = time.perf_counter() - epoch_start
+        train_loss, train_batches, seen = all_reduce_sum([train_loss, len(train_loader), seen])
+        avg_train_loss = train_loss / train_batches
 
         # -----------------------------
         # VALIDATION
@@ -144,12 +296,14 @@ def train():
         correct, total = 0, 0
 
         with torch.no_grad():
-            for imgs, poses, labels in tqdm(val_loader, desc="Validation"):
+            for imgs, poses, labels in tqdm(val_loader, desc="Validation", disable=not is_main):
                 imgs = imgs.to(DEVICE)
                 poses = poses.to(DEVICE)
                 labels = labels.to(DEVICE)
 
-                logits = model(imgs, poses)
+                with torch.autocast(device_type=amp[0], dtype=amp[1], enabled=amp[2]):
+                    logits = model(imgs, poses)
+                logits = logits.float()
                 loss = criterion(logits, labels)
                 val_loss += loss.item()
 
@@ -157,31 +311,293 @@ def train():
                 correct += (preds == labels).sum().item()
                 total += labels.size(0)
 
-        avg_val_loss = val_loss / len(val_loader)
+        # DistributedSampler pads the last shard, so a few samples may count twice
+        val_loss, val_batches, correct, total = all_reduce_sum(
+            [val_loss, len(val_loader), correct, total]
+        )
+        avg_val_loss = val_loss / val_batches
         val_acc = 100.0 * correct / total
 
-        print(
-            f"Train Loss: {avg_train_loss:.4f} | "
-            f"Val Loss: {avg_val_loss:.4f} | "
-            f"Val Acc: {val_acc:.2f}%"
-        )
+        if is_main:
+            print(
+                f"Train Loss: {avg_train_loss:.4f} | "
+                f"Val Loss: {avg_val_loss:.4f} | "
+                f"Val Acc: {val_acc:.2f}% | "
+                f"Throughput: {seen / epoch_time:.1f} samples/s ({world_size} proc)"
+            )
 
         # -----------------------------
         # CHECKPOINT
         # -----------------------------
+        # avg_val_loss is all-reduced, so every rank takes the same branch
         if avg_val_loss < best_val_loss:
             best_val_loss = avg_val_loss
-            os.makedirs("weights", exist_ok=True)
-            torch.save(model.state_dict(), MODEL_WEIGHTS_PATH)
-            print("✅ Saved new best model")
+            if is_main:
+                os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+                save_checkpoint(raw_model, out_path)
+                print("✅ Saved new best model")
 
     # =====================================================
     # 4. APPLY EMA WEIGHTS (FINAL)
     # =====================================================
-    ema.apply_to(model)
-    torch.save(model.state_dict(), MODEL_WEIGHTS_PATH)
-    print("✅ EMA weights applied and saved")
+    if is_main:
+        ema.apply_to(raw_model)
+        save_checkpoint(raw_model, out_path)
+        print("✅ EMA weights applied and saved")
+
+    if distributed:
+        dist.barrier()
+        cleanup_distributed()
+
+
+# =====================================================
+# CASCADE: POSE GATE DISTILLATION + REPORT
+# =====================================================
+@torch.no_grad()
+def collect_outputs(model, loader):
+    """Run the full model over a loader; returns poses, logits, labels and model seconds"""
+    all_poses, all_logits, all_labels = [], [], []
+    model_time = 0.0
+    for imgs, poses, labels in tqdm(loader, desc="Scoring"):
+        start = time.perf_counter()
+        logits = model(imgs.to(DEVICE), poses.to(DEVICE)).float().cpu()
+        model_time += time.perf_counter() - start
+        all_poses.append(poses)
+        all_logits.append(logits.view(-1))
+        all_labels.append(labels.view(-1))
+    return torch.cat(all_poses), torch.cat(all_logits), torch.cat(all_labels), model_time
+
+
+def train_pose_gate():
+    """Distil the served fusion model into the pose-only gate used for cascaded inference"""
+    train_dir, _ = resolve_dataset_dirs()
+    loader = DataLoader(
+        ShopliftDataset(train_dir),
+        batch_size=BATCH_SIZE, shuffle=False, num_workers=NUM_WORKERS,
+    )
+    poses, teacher_logits, labels, _ = collect_outputs(load_checkpoint(INFERENCE_WEIGHTS_PATH), loader)
+    # Soft targets from the full model, raised to 1 on true positives so the
+    # gate errs towards passing real shoplifting frames through
+    targets = torch.maximum(torch.sigmoid(teacher_logits), labels)
+
+    gate = PoseGate()
+    optimizer = AdamW(gate.parameters(), lr=1e-3, weight_decay=1e-4)
+    criterion = nn.BCEWithLogitsLoss()
+    gate_loader = DataLoader(TensorDataset(poses, targets), batch_size=64, shuffle=True)
+
+    for epoch in range(POSE_GATE_EPOCHS):
+        total = 0.0
+        for p, t in gate_loader:
+            optimizer.zero_grad()
+            loss = criterion(gate(p).view(-1), t)
+            loss.backward()
+            optimizer.step()
+            total += loss.item()
+        print(f"Pose gate epoch {epoch+1}/{POSE_GATE_EPOCHS} | Loss: {total / len(gate_loader):.4f}")
+
+    os.makedirs(os.path.dirname(POSE_GATE_WEIGHTS_PATH), exist_ok=True)
+    torch.save(gate.state_dict(), POSE_GATE_WEIGHTS_PATH)
+    print(f"✅ Saved pose gate to {POSE_GATE_WEIGHTS_PATH}")
+
+
+@torch.no_grad()
+def cascade_report(thresholds=(0.0, 0.05, 0.1, 0.2, 0.3, 0.5)):
+    """
+    Recall vs image-stream cost of cascaded inference on the validation set.
+    YOLO pose runs in both modes, so only the image-stream time is compared.
+    """
+    _, valid_dir = resolve_dataset_dirs()
+    loader = DataLoader(
+        ShopliftDataset(valid_dir),
+        batch_size=BATCH_SIZE, shuffle=False, num_workers=NUM_WORKERS,
+    )
+    poses, logits, labels, model_time = collect_outputs(load_checkpoint(INFERENCE_WEIGHTS_PATH), loader)
+    full_probs = torch.sigmoid(logits)
+    person = poses.abs().sum(dim=1) > 0  # extract_pose leaves all-zero poses when nobody is found
+    positives = labels > 0.5
+    full_ms = 1000 * model_time / len(labels)
+
+    gate = None
+    if os.path.exists(POSE_GATE_WEIGHTS_PATH):
+        gate = PoseGate()
+        gate.load_state_dict(torch.load(POSE_GATE_WEIGHTS_PATH, map_location="cpu"))
+        gate.eval()
+        gate_scores = torch.sigmoid(gate(poses)).view(-1)
+    else:
+        print("No pose gate trained; reporting the person-present rule only")
+        thresholds = (None,)
+
+    def recall(probs):
+        return ((probs > 0.5) & positives).sum().item() / max(1, positives.sum().item())
+
+    print(f"\nFull model: recall {recall(full_probs):.3f} | {full_ms:.2f} ms/frame image stream")
+    print(f"{'threshold':>9} | {'full-model %':>12} | {'recall':>6} | {'ms/frame':>8} | {'speedup':>7}")
+    for t in thresholds:
+        if gate is None:
+            run = person
+            probs = torch.where(run, full_probs, torch.zeros_like(full_probs))
+        else:
+            run = person & (gate_scores >= t)
+            cheap = torch.where(person, gate_scores, torch.zeros_like(gate_scores))
+            probs = torch.where(run, full_probs, cheap)
+        frac = run.float().mean().item()
+        label = "person" if t is None else f"{t:.2f}"
+        speedup = 1 / frac if frac > 0 else float("inf")
+        print(f"{label:>9} | {100 * frac:>11.1f}% | {recall(probs):>6.3f} | {frac * full_ms:>8.2f} | {speedup:>6.1f}x")
+
+
+# =====================================================
+# SYNTHETIC BENCHMARKS
+# =====================================================
+def _benchmark_worker(rank, world_size, steps, results, precision=PRECISION,
+                      accum_steps=GRAD_ACCUM_STEPS, compile_model=COMPILE_MODEL):
+    """Run `steps` synthetic optimizer steps and report timing/memory from rank 0"""
+    distributed = world_size > 1
+    if distributed:
+        setup_distributed(rank, world_size)
+    torch.manual_seed(rank)
+
+    # Random init: timings don't depend on the weights, and ranks must not race to download them
+    raw_model = DualStreamTransformerFusion(pretrained=False).to(DEVICE)
+    model = DDP(raw_model) if distributed else raw_model
+    if compile_model:
+        model = torch.compile(model)
+    optimizer = AdamW(model.parameters(), lr=LR, weight_decay=1e-4)
+    criterion = nn.BCEWithLogitsLoss()
+    amp = autocast_settings(precision)
+    scaler = torch.cuda.amp.GradScaler(enabled=(amp[1] == torch.float16))
+
+    imgs = torch.randn(BATCH_SIZE, 3, IMG_SIZE, IMG_SIZE, device=DEVICE)
+    poses = torch.randn(BATCH_SIZE, POSE_DIM, device=DEVICE)
+    labels = torch.randint(0, 2, (BATCH_SIZE, 1), device=DEVICE).float()
+
+    def step():
+        for m in range(accum_steps):
+            train_step(model, imgs, poses, labels, criterion, scaler, amp,
+                       accum_steps=accum_steps, sync=(m == accum_steps - 1))
+        optimizer_step(model, optimizer, scaler)
+
+    model.train()
+    step()  # warm-up (and compilation), excluded from timing
+    if distributed:
+        dist.barrier()
+    if DEVICE.type == "cuda":
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+    start = time.perf_counter()
+    for _ in range(steps):
+        step()
+    if DEVICE.type == "cuda":
+        torch.cuda.synchronize()
+    if distributed:
+        dist.barrier()
+    elapsed = time.perf_counter() - start
+
+    if rank == 0:
+        if DEVICE.type == "cuda":
+            peak_mb = torch.cuda.max_memory_allocated() / 2**20
+        else:
+            try:
+                import resource  # Unix-only
+                # ru_maxrss is in KiB on Linux; each variant runs in a fresh process
+                peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            except ImportError:
+                peak_mb = float("nan")  # not reported on Windows
+        results.put({
+            "world_size": world_size,
+            "samples_per_sec": steps * accum_steps * BATCH_SIZE * world_size / elapsed,
+            "ms_per_step": 1000 * elapsed / steps,
+            "peak_mem_mb": peak_mb,
+        })
+    cleanup_distributed()
+
+
+def _run_benchmark(world_size, steps, results, port_offset=0, precision=PRECISION,
+                   accum_steps=GRAD_ACCUM_STEPS, compile_model=COMPILE_MODEL):
+    # Fresh port per run so a lingering socket from the previous group cannot collide
+    os.environ["MASTER_PORT"] = str(DIST_MASTER_PORT + port_offset)
+    mp.spawn(
+        _benchmark_worker,
+        args=(world_size, steps, results, precision, accum_steps, compile_model),
+        nprocs=world_size, join=True,
+    )
+    return results.get()
+
+
+def scaling_report(world_sizes=(1, 2, 4, 8), steps=20):
+    """Measure samples/s for each process count and print scaling efficiency vs 1 process"""
+    throughput = {}
+    with mp.get_context("spawn").Manager() as manager:
+        results = manager.Queue()
+        for i, n in enumerate(world_sizes):
+            throughput[n] = _run_benchmark(n, steps, results, port_offset=i)["samples_per_sec"]
+
+    base = throughput.get(1)
+    print(f"\n{'procs':>5} | {'samples/s':>10} | {'speedup':>7} | {'efficiency':>10}")
+    for n in world_sizes:
+        speedup = throughput[n] / base if base else float("nan")
+        print(f"{n:>5} | {throughput[n]:>10.2f} | {speedup:>7.2f} | {100 * speedup / n:>9.1f}%")
+    return throughput
+
+
+def step_profile_report(steps=10, accum_steps=4):
+    """Compare per-step time and peak memory for fp32, bf16/fp16, accumulation and torch.compile"""
+    amp_precision = "fp16" if DEVICE.type == "cuda" else "bf16"
+    variants = [
+        ("fp32", dict(precision="fp32", accum_steps=1, compile_model=False)),
+        (amp_precision, dict(precision=amp_precision, accum_steps=1, compile_model=False)),
+        (f"{amp_precision} x{accum_steps} accum",
+         dict(precision=amp_precision, accum_steps=accum_steps, compile_model=False)),
+        (f"{amp_precision} + compile", dict(precision=amp_precision, accum_steps=1, compile_model=True)),
+    ]
+    rows = []
+    with mp.get_context("spawn").Manager() as manager:
+        results = manager.Queue()
+        for name, kwargs in variants:
+            rows.append((name, kwargs["accum_steps"], _run_benchmark(1, steps, results, **kwargs)))
+
+    print(f"\n{'variant':<22} | {'eff. batch':>10} | {'ms/step':>9} | {'samples/s':>10} | {'peak MB':>9}")
+    for name, accum, r in rows:
+        print(
+            f"{name:<22} | {BATCH_SIZE * accum:>10} | {r['ms_per_step']:>9.1f} | "
+            f"{r['samples_per_sec']:>10.2f} | {r['peak_mem_mb']:>9.1f}"
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the dual-stream shoplifting model")
+    parser.add_argument("--nproc", type=int, default=1,
+                        help="Number of local training processes (gloo DDP when > 1)")
+    parser.add_argument("--scaling", type=str, default=None,
+                        help="Comma-separated process counts for a synthetic scaling report, e.g. 1,2,4,8")
+    parser.add_argument("--scaling-steps", type=int, default=20)
+    parser.add_argument("--step-profile", action="store_true",
+                        help="Compare per-step time and memory across precision/accumulation/compile")
+    parser.add_argument("--distill", action="store_true",
+                        help="Train the STUDENT_* model with the trained MODEL_WEIGHTS_PATH model as teacher")
+    parser.add_argument("--pose-gate", action="store_true",
+                        help="Distil the trained model into the pose-only gate for cascaded inference")
+    parser.add_argument("--cascade-report", action="store_true",
+                        help="Recall vs speed of cascaded inference on the validation set")
+    args = parser.parse_args()
+
+    if args.pose_gate:
+        train_pose_gate()
+    elif args.cascade_report:
+        cascade_report()
+    elif args.step_profile:
+        step_profile_report()
+    elif args.scaling:
+        scaling_report([int(n) for n in args.scaling.split(",")], steps=args.scaling_steps)
+    elif "RANK" in os.environ and "WORLD_SIZE" in os.environ:
+        # Launched by torchrun, which already set up one process per rank
+        train(int(os.environ["RANK"]), int(os.environ["WORLD_SIZE"]), args.distill)
+    elif args.nproc > 1:
+        mp.spawn(train, args=(args.nproc, args.distill), nprocs=args.nproc, join=True)
+    else:
+        train(distill=args.distill)
 
 
 if __name__ == "__main__":
-    train()
+    main()